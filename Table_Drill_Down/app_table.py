@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
@@ -7,11 +6,21 @@ import dash_table as dt
 import numpy as np
 import os
 import pandas as pd
+import json
 import plotly
-import time
+import sys
+import threading
+import uuid
 
 from dash.exceptions import PreventUpdate
-from dash.dependencies import Input, Output, State, Event
+# callback_metrics.py, compression.py and static_assets.py are shared with the
+# apps of the parent folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import callback_metrics
+import compression
+import static_assets
+from drilldown import Hierarchy, JobPool, LatestRequests, Level, Stream, TailReader, ViewCache
+from dash.dependencies import Input, Output, State
 from flask import Flask
 from plotly import graph_objs as go
 from plotly.graph_objs import *
@@ -19,14 +28,82 @@ from plotly.graph_objs import *
 
 app = dash.Dash(__name__)
 server = app.server
+# timings and payload sizes of the callbacks at /metrics
+callback_metrics.instrument(app)
+# brotli or gzip for the table, chart and layout payloads
+compression.compress(app)
+# Bootstrap grid CSS, served locally once copied to static/grid.css
+static_assets.install(app)
 
 # Datasets
 brands = pd.read_csv('Brands.csv')
 models = pd.read_csv('Models.csv')
 sales = pd.read_csv('Sales.csv')
 
-# Boostrap CSS.
-app.css.append_css({'external_url': 'https://codepen.io/amyoshino/pen/jzXypZ.css'})
+# Drill-down hierarchy: Brand --> Model --> Sale date. Each level declares its
+# key column, its table, the rollups computed from the level below it and how
+# its chart is drawn. Brand aggregates are rolled up from the models instead
+# of kept in Brands.csv, which only lists the brands, and new model or sale
+# rows are added with hierarchy.append(depth, rows), which updates the rollups
+# of every level above them without recomputing the others.
+# The navigation path stored in the browser holds the selected key of every
+# level above the current one
+# ex.: [] --> brands, ['Honda'] --> Honda models, ['Honda', 'Civic'] --> Civic sales
+hierarchy = Hierarchy([
+    Level('Brand', brands[['Brand']],
+          rollups={'Models': ('Model', 'count'),
+                   'Average Price': ('Price', 'mean')},
+          chart=dict(title='Chart XYZ', x='Models', y='Average Price',
+                     label='Brand', size='', xaxis='Models', yaxis='Average Price')),
+    Level('Model', models,
+          rollups={'Sale Dates': ('Date', 'count')},
+          chart=dict(title='Chart XYZ 2', x='Price', y='Sales',
+                     label='Model', size='Sales', xaxis='Price', yaxis='Sales')),
+    Level('Date', sales,
+          chart=dict(title='Chart XYZ 3', x='x', y='y',
+                     label='Model', size='', xaxis='X', yaxis='Y'))
+])
+
+# Filter bands of the dropdowns, dropdown value --> (label, range predicates on
+# the brands table). A range (low, high) keeps low <= value < high, None
+# leaves an end open
+model_bands = [
+    ('No filter', {}),
+    ('2', {'Models': (2, 3)}),
+    ('3', {'Models': (3, 4)}),
+    ('4', {'Models': (4, 5)})
+]
+price_bands = [
+    ('No filter', {}),
+    ('1 to 20k', {'Average Price': (1, 20000)}),
+    ('20k to 30k', {'Average Price': (20000, 30000)}),
+    ('30k+', {'Average Price': (30000, None)})
+]
+
+def band_options(bands):
+    return [{'label': label, 'value': i} for i, (label, _) in enumerate(bands)]
+
+# Live sales: with SALES_STREAM=<csv file>, rows appended to that file (same
+# columns as Sales.csv) are ingested every STREAM_INTERVAL ms and the sales
+# chart on screen receives only the new points
+# ex.: SALES_STREAM=new_sales.csv python app_table.py
+stream_path = os.environ.get('SALES_STREAM')
+stream_interval = int(os.environ.get('STREAM_INTERVAL', 2000))
+stream = Stream(hierarchy, 2, TailReader(stream_path, sales.columns)) if stream_path else None
+# held while a view is built so it never sees half of an ingested batch
+ingest_lock = stream.lock if stream else threading.RLock()
+# With VALIDATE_ROLLUPS=1 every ingested batch is followed by a full recompute
+# of the rollups, which must match the incrementally updated ones
+validate_rollups = os.environ.get('VALIDATE_ROLLUPS') == '1'
+
+# Levels with at least BACKGROUND_ROWS rows are built in a pool of JOB_WORKERS
+# processes (default: one per CPU), in chunks of BACKGROUND_CHUNK rows. The
+# request returns at once with an empty level, and the job-interval polls the
+# job until its result replaces it
+background_rows = int(os.environ.get('BACKGROUND_ROWS', 50000))
+background_chunk = int(os.environ.get('BACKGROUND_CHUNK', 25000))
+job_workers = int(os.environ['JOB_WORKERS']) if os.environ.get('JOB_WORKERS') else None
+jobs = JobPool(job_workers)
 
 layout = dict(
     autosize=True,
@@ -41,8 +118,115 @@ layout = dict(
     )
 )
 
+#Table function
+def table_columns(data):
+    return [{'id': c, 'name': c} for c in data.columns]
+
+# The table is created once with the layout, drill-downs only replace its
+# data and columns
+def make_table(data, output):
+    return html.Div(
+    [
+        dt.DataTable(
+            id = output,
+            data=data.to_dict('records'),
+            columns=table_columns(data),
+            style_as_list_view=True,
+            filter_action='none',
+            selected_rows=[],
+            style_cell={'padding': '5px',
+                        'whiteSpace': 'no-wrap',
+                        'overflow': 'hidden',
+                        'textOverflow': 'ellipsis',
+                        'maxWidth': 0,
+                        'height': 30,
+                        'textAlign': 'left'},
+            style_header={
+                'backgroundColor': 'white',
+                'fontWeight': 'bold',
+                'color': 'black'
+            },
+            style_cell_conditional=[],
+            virtualization=True,
+            page_action='none',
+            fixed_rows={'headers': True}
+        ),
+    ], className="seven columns", style = {'margin-top': '35',
+                                           'margin-left': '15',
+                                           'border': '1px solid #C6CCD5'}
+)
+
+# Figures are built as plain dicts of NumPy arrays, which Dash's JSON encoder
+# writes out directly. Validating them through plotly.graph_objs costs more
+# than building them on large levels, so it only runs with VALIDATE_FIGURES=1
+# (ex.: while developing a new chart)
+validate_figures = os.environ.get('VALIDATE_FIGURES') == '1'
+
+def column_array(column):
+    # NaN is not valid JSON, the encoder would decode and re-encode the whole
+    # response to replace it, so missing values are sent as null right away
+    values = column.to_numpy()
+    if values.dtype.kind == 'f' and np.isnan(values).any():
+        values = np.where(np.isnan(values), None, values)
+    return values
+
+def make_chart(df, x, y, label = 'Author', size = 'Size'):
+    graph = []
+    if size == '':
+        s = 15
+    else:
+        s = column_array(df[size])
+    graph.append(dict(
+            type='scatter',
+            x=column_array(df[x]),
+            y=column_array(df[y]),
+            mode='markers',
+            text = (label + ': ' + df[label].astype(str)).to_numpy(),
+            opacity=0.7,
+            marker={
+                'size': s,
+                'line': {'width': 0.5, 'color': 'white'}
+            },
+            name='X'
+        ))
+
+    return graph
+
+def make_layout(chart):
+    # chart: the chart settings of a level
+    layout_individual = dict(layout)
+    layout_individual['legend'] = dict(x=0.05, y=1)
+    layout_individual['title'] = chart['title']
+    layout_individual['xaxis'] = dict(title=chart['xaxis'])
+    layout_individual['yaxis'] = dict(title=chart['yaxis'])
+    return layout_individual
+
+def make_figure(df, chart, data=None):
+    # data: the chart's traces when already built, ex.: by a background job
+    figure = {
+        'data': make_chart(df, chart['x'], chart['y'], chart['label'], chart['size']) if data is None else data,
+        'layout': make_layout(chart)
+    }
+    if validate_figures:
+        go.Figure(figure)
+
+    return figure
+
+# Rendered levels by view key, so repeated or concurrent requests for the same
+# state (a filter set back and forth) build it only once
+views = ViewCache()
+# Requests of a page are tagged with its session id. One followed within
+# 50 ms by a newer request of the same page skips its build, so a burst of
+# different events (filters changed in a row, Back pressed twice) only builds
+# the last view; the browser would discard the older responses anyway
+latest = LatestRequests(window=0.05)
+
+def view_key(path, ranges):
+    # the filters only apply to the top level, and appends change every level
+    return json.dumps([path, sorted(ranges.items()) if not path else [], hierarchy.version])
+
 # Layout
-app.layout = html.Div([
+page = html.Div([
     # Title - Row
     html.Div(
         [
@@ -59,8 +243,14 @@ app.layout = html.Div([
 
     #block 2
     html.Div([
-        dcc.Store(id = 'memory'),
+        # position of the last streamed sale drawn on the chart, for the view
+        # in memory
+        dcc.Store(id = 'stream-cursor'),
+        dcc.Interval(id = 'stream-interval', interval=stream_interval,
+                     disabled=stream is None),
+        dcc.Interval(id = 'job-interval', interval=500, disabled=True),
         html.H3('Cars'),
+        html.P(id = 'job-progress'),
         html.Div(
             [
                 html.Div(
@@ -68,12 +258,7 @@ app.layout = html.Div([
                         html.P('Models:'),
                         dcc.Dropdown(
                                 id = 'filter_x',
-                                options=[
-                                    {'label': 'No filter', 'value': 0},
-                                    {'label': '2', 'value': 1},
-                                    {'label': '3', 'value': 2},
-                                    {'label': '4', 'value': 3}
-                                ],
+                                options=band_options(model_bands),
                                 value='0'
                         ),
                     ],
@@ -85,12 +270,7 @@ app.layout = html.Div([
                         html.P('Price:'),
                         dcc.Dropdown(
                                 id = 'filter_y',
-                                options=[
-                                    {'label': 'No filter', 'value': 0},
-                                    {'label': '1 to 20k', 'value': 1},
-                                    {'label': '20k to 30k', 'value': 2},
-                                    {'label': '30k+', 'value': 3}
-                                ],
+                                options=band_options(price_bands),
                                 value='0'
                         )
                     ],
@@ -119,13 +299,13 @@ app.layout = html.Div([
             [
                 html.Div(
                     [
-                        dcc.Graph(id='chart-2')
+                        dcc.Graph(id='chart-2',
+                                  figure=make_figure(hierarchy.rows([]), hierarchy.levels[0].chart))
                     ], className = "four columns", style = {'margin-top': 35,
                                                             'padding': '15',
                                                             'border': '1px solid #C6CCD5'}
                 ),
-                html.Div(id = 'table-box'),
-                html.Div(dt.DataTable(id = 'table', data=[{}]), style={'display': 'none'})
+                html.Div(make_table(hierarchy.rows([]), 'table'), id = 'table-box')
             ], className = 'row'
         )
     ], className = 'row',  style = {'margin-top': 20, 'border':
@@ -133,185 +313,196 @@ app.layout = html.Div([
                                     'border-radius': '5px'})
 ], style = {'padding': '25px'})
 
-#Table function
-def make_table(data, output):
-    return html.Div(
-    [
-        dt.DataTable(
-            id = output,
-            data=data.to_dict('rows'),
-            columns=[{'id': c, 'name': c} for c in data.columns],
-            style_as_list_view=True,
-            filtering=False,
-            selected_rows=[],
-            style_cell={'padding': '5px',
-                        'whiteSpace': 'no-wrap',
-                        'overflow': 'hidden',
-                        'textOverflow': 'ellipsis',
-                        'maxWidth': 0,
-                        'height': 30,
-                        'textAlign': 'left'},
-            style_header={
-                'backgroundColor': 'white',
-                'fontWeight': 'bold',
-                'color': 'black'
-            },
-            style_cell_conditional=[],
-            virtualization=True,
-            pagination_mode=False,
-            n_fixed_rows=1
-        ),
-    ], className="seven columns", style = {'margin-top': '35',
-                                           'margin-left': '15',
-                                           'border': '1px solid #C6CCD5'}
-)
+def serve_layout():
+    # every page load gets its own session id in memory
+    return html.Div([
+        dcc.Store(id = 'memory', data={'path': [], 'view': view_key([], {}), 'position': 0,
+                                       'session': uuid.uuid4().hex}),
+        page
+    ])
 
-def make_chart(df, x, y, label = 'Author', size = 'Size'):
-    graph = []
-    if size == '':
-        s = 15
-    else:
-        s = df[size]
-    graph.append(go.Scatter(
-            x=df[x],
-            y=df[y],
-            mode='markers',
-            text = ['{}: {}'.format(label, a) for a in df[label]],
-            opacity=0.7,
-            marker={
-                'size': s,
-                'line': {'width': 0.5, 'color': 'white'}
-            },
-            name='X'
-        ))
+app.layout = serve_layout
 
-    return graph
+def render_rows(job):
+    # background job chunk: table records and chart trace of some level rows
+    df, chart = job
+    return df.to_dict('records'), make_chart(df, chart['x'], chart['y'], chart['label'], chart['size'])[0]
 
-# Callbacks and functions
-@app.callback(dash.dependencies.Output('memory', 'data'),
-              [dash.dependencies.Input('table', 'selected_cells'),
-               dash.dependencies.Input('table', 'derived_virtual_data')],
-              [dash.dependencies.State('memory', 'data')])
-def tab(sel, table, state):
-    # to initialize variables when it is None
-    if state is None:
-        state = {}
-    if table is None:
-        state['data'] = brands.to_dict('records')
-        table = [{}]
-    else:
-        state['data'] = table #save current table value afer it gets initialized
+def combine_rows(parts, columns, chart, position):
+    # joins the chunks of render_rows into a level view
+    records = [record for part, _ in parts for record in part]
+    trace = dict(parts[0][1])
+    for name in ('x', 'y', 'text'):
+        trace[name] = np.concatenate([part[name] for _, part in parts])
+    if chart['size']:
+        trace['marker'] = dict(trace['marker'], size=np.concatenate([part['marker']['size'] for _, part in parts]))
+    return records, columns, make_figure(None, chart, data=[trace]), position
+
+def show_view(path, key, view):
+    # outputs of update_image_src for a built level
+    data, columns, figure, position = view
+    # the cell selection is cleared so the same cell of the next level can be clicked
+    return (data, columns, None, [], {'path': path, 'view': key, 'position': position},
+            figure, True, '')
+
+def level_view(path, ranges):
+    # builds the table and chart of the level a navigation path points to,
+    # ranges filter the top level table. Large levels are handed to the job
+    # pool and shown empty until the job-interval finds their result
+    key = view_key(path, ranges)
+    chart = hierarchy.level(path).chart
+    view = views.cached(key)
+    if view is not None:
+        return show_view(path, key, view)
+
+    with ingest_lock:
+        df = hierarchy.rows(path) if path else hierarchy.select(ranges)
+        position = stream.position if stream else 0
+
+    if len(df) >= background_rows:
+        columns = table_columns(df)
+        chunks = [(df.iloc[start:start + background_chunk], chart)
+                  for start in range(0, len(df), background_chunk)]
+        jobs.submit(key, render_rows, chunks,
+                    lambda parts: combine_rows(parts, columns, chart, position))
+        loading = dict(chart, title=chart['title'] + ' (loading)')
+        return ([], columns, None, [], {'path': path, 'view': key, 'position': position, 'job': key},
+                make_figure(None, loading, data=[]), False, 'Loading {} rows...'.format(len(df)))
+
+    def build():
+        return df.to_dict('records'), table_columns(df), make_figure(df, chart), position
+    return show_view(path, key, views.get(key, build))
 
-    # store information of selected rows to retrieve them when back button is clicked
-    # information is stored in json format
-    #
-    if sel:
-        if 'Brand' in table[0].keys():
-            state['Brand'] = table[0]['Brand']
-        if 'Model' in table[0].keys() and table is not None:
-            state['Model'] = table[0]['Model']
+def job_view(state, ranges):
+    # outputs of update_image_src while the level on screen waits for its job
+    path, key = state.get('path', []), state['job']
+    status, progress, result = jobs.status(key)
+    if status == 'done':
+        # the view cache holds it from now on
+        views.put(key, result)
+        jobs.discard(key)
+        return show_view(path, key, result)
+    if status == 'running':
+        return (dash.no_update,) * 6 + (False, 'Loading... {:.0%}'.format(progress))
+    if status == 'error':
+        return (dash.no_update,) * 6 + (True, 'Failed to load this level: {}'.format(result))
+    # the job runs in another server process, or its result was dropped
+    return level_view(path, ranges)
 
-    return state
+def in_session(outputs, state):
+    # the new memory of the page keeps its session id
+    if isinstance(outputs[4], dict):
+        outputs[4]['session'] = (state or {}).get('session')
+    return outputs
 
+# Callbacks and functions
 @app.callback(
-    dash.dependencies.Output('table-box', 'children'),
+    [dash.dependencies.Output('table', 'data'),
+     dash.dependencies.Output('table', 'columns'),
+     dash.dependencies.Output('table', 'active_cell'),
+     dash.dependencies.Output('table', 'selected_cells'),
+     dash.dependencies.Output('memory', 'data'),
+     dash.dependencies.Output('chart-2', 'figure'),
+     dash.dependencies.Output('job-interval', 'disabled'),
+     dash.dependencies.Output('job-progress', 'children')],
     [dash.dependencies.Input('filter_x', 'value'),
     dash.dependencies.Input('filter_y', 'value'),
-    dash.dependencies.Input('button_chart', 'n_clicks_timestamp'),
-    dash.dependencies.Input('back_button', 'n_clicks_timestamp'),
-    dash.dependencies.Input('table', 'selected_cells')],
-    [dash.dependencies.State('memory', 'data')])
-def update_image_src(fx, fy, button, back, selected_cell, current_table):
-    res = brands.copy()
-    if fx == 1:
-        res = res[res['Models'] == 2]
-    if fx == 2:
-        res = res[res['Models'] == 3]
-    if fx == 3:
-        res = res[res['Models'] == 4]
-    if fy == 1:
-        res = res[(res['Average Price'] >= 1) & (res['Average Price'] <= 20000)]
-    if fy == 2:
-        res = res[(res['Average Price'] >= 20001) & (res['Average Price'] <= 30000)]
-    if fy == 3:
-        res = res[res['Average Price'] >= 30001]
-
-    # Reset Chart Button conditionals
-    # stamp: actual timestamp
-    # button: timestamp of button click
-    # if stamp == button then there's a new click. The str transformation was
-    # necessary as time.time() returns 10 digits and button 13 digits
-    # ex.: time.time() --> 1548657188 button -->1548657188440
-    if button is None:
-        button = 0
-    stamp = str(time.time())[:10]
-    if stamp == str(button)[:10]:
-        return make_table(res, 'table')
-
-    # Retrieves data saved in browser memory to remember previous level selection
-    # then apply to previous level dataset
-    # ex.: if select Honda --> Civic --> back button, when back button is clicked
-    # it will remember to show only Honda cars
-    if back is None:
-        back = 0
-    stamp = str(time.time())[:10]
-    if stamp == str(back)[:10]:
-        if 'Price' in current_table['data'][0].keys():
-            return make_table(res, 'table')
-        if 'Date' in current_table['data'][0].keys():
-            return make_table(models[models['Brand'] == current_table['Brand']], 'table')
-
-    # When selection occurs, the code looks for the current table and based on a
-    # differentiator column (unique among all datasets) it decides the next level table
-    # ex.: if Average Price is in current table columns, then current table is "brands"
-    # and next table is "models"
-    if selected_cell:
-        print(current_table)
-        if 'Average Price' in current_table['data'][0].keys():
-            res = models[models['Brand'] == current_table['data'][list(selected_cell)[0][0]]['Brand']]
-        if 'Price' in current_table['data'][0].keys():
-            res = sales[sales['Model'] == current_table['data'][list(selected_cell)[0][0]]['Model']]
-        if 'Date' in current_table['data'][0].keys():
+    dash.dependencies.Input('button_chart', 'n_clicks'),
+    dash.dependencies.Input('back_button', 'n_clicks'),
+    dash.dependencies.Input('table', 'active_cell'),
+    dash.dependencies.Input('job-interval', 'n_intervals')],
+    [dash.dependencies.State('memory', 'data')],
+    # the initial level is already in the layout
+    prevent_initial_call=True)
+def update_image_src(fx, fy, button, back, active_cell, n_intervals, state):
+    # the browser only keeps the navigation path, every level is rebuilt on
+    # the server from it
+    path = (state or {}).get('path', [])
+
+    # the dropdown bands are range queries on the brands' rollups
+    ranges = dict(model_bands[int(fx or 0)][1])
+    ranges.update(price_bands[int(fy or 0)][1])
+
+    # Dash reports which inputs changed in this request. Simultaneous changes
+    # arrive as one request, Reset wins over Back, Back over a table click
+    triggered = [t['prop_id'] for t in dash.callback_context.triggered]
+
+    # the job-interval only runs while a level is built in the background
+    if triggered == ['job-interval.n_intervals']:
+        if not (state or {}).get('job'):
             raise PreventUpdate
+        return in_session(job_view(state, ranges), state)
 
-    return make_table(res, 'table')
+    # this request supersedes the earlier ones of the page still waiting
+    session = (state or {}).get('session')
+    ticket = latest.take(session) if session else None
 
-@app.callback(
-    dash.dependencies.Output('chart-2', 'figure'),
-    [dash.dependencies.Input('table', 'data')])
-def update_image_src(data):
-    layout_individual = copy.deepcopy(layout)
-    layout_individual['legend'] = legend=dict(x=0.05, y=1)
+    # Reset Chart Button goes back to the brands table
+    if 'button_chart.n_clicks' in triggered:
+        path = []
 
-    df = pd.DataFrame(data)
-    graph = []
+    # Back button goes one level up the navigation path
+    # ex.: if select Honda --> Civic --> back button, the path goes from
+    # ['Honda', 'Civic'] to ['Honda'] and shows only Honda cars
+    elif 'back_button.n_clicks' in triggered:
+        path = path[:-1]
 
-    # The callback retrieve the new data after click and based on its columns,
-    # we decide the x axis, y axis, label and size of dots to pass to make_chart()
-    if 'Average Price' in data[0].keys():
-        layout_individual['title'] = 'Chart XYZ'
-        layout_individual['xaxis'] = dict(title='Models')
-        layout_individual['yaxis'] = dict(title='Average Price')
-        graph = make_chart(pd.DataFrame(data), 'Models', 'Average Price', 'Brand', '')
-
-    if 'Price' in data[0].keys():
-        layout_individual['title'] = 'Chart XYZ 2'
-        layout_individual['xaxis'] = dict(title='Price')
-        layout_individual['yaxis'] = dict(title='Sales')
-        graph = make_chart(pd.DataFrame(data), 'Price', 'Sales', 'Model', 'Sales')
-
-    if 'Date' in data[0].keys():
-        layout_individual['title'] = 'Chart XYZ 3'
-        layout_individual['xaxis'] = dict(title='X')
-        layout_individual['yaxis'] = dict(title='Y')
-        graph = make_chart(pd.DataFrame(data), 'x', 'y', 'Model', '')
+    # When selection occurs, the key of the selected row is appended to the
+    # path and the next level table is built from it
+    # ex.: clicking Honda in the brands table gives path ['Honda'] --> models
+    elif 'table.active_cell' in triggered and active_cell:
+        if hierarchy.is_leaf(path):
+            raise PreventUpdate
+        with ingest_lock:
+            current = hierarchy.rows(path) if path else hierarchy.select(ranges)
+        path = path + [current.iloc[active_cell['row']][hierarchy.level(path).key]]
 
-    figure = {
-        'data': graph,
-        'layout': layout_individual
-    }
+    # nothing to send when the view on screen is already the requested one,
+    # ex.: Reset on the brands table or a filter change below the top level
+    if view_key(path, ranges) == (state or {}).get('view'):
+        raise PreventUpdate
 
-    return figure
+    # a view to build is only built if no newer request of the page follows
+    if ticket and views.cached(view_key(path, ranges)) is None \
+            and latest.superseded(session, ticket):
+        raise PreventUpdate
+
+    return in_session(level_view(path, ranges), state)
+
+@app.callback(
+    [dash.dependencies.Output('chart-2', 'extendData'),
+     dash.dependencies.Output('stream-cursor', 'data')],
+    [dash.dependencies.Input('stream-interval', 'n_intervals')],
+    [dash.dependencies.State('memory', 'data'),
+     dash.dependencies.State('stream-cursor', 'data')],
+    prevent_initial_call=True)
+def stream_sales(n_intervals, state, cursor):
+    # ingests the new sales, then sends the chart the points of the model on
+    # screen that arrived after the last one it has drawn. The other levels
+    # show the new rollups the next time they are built
+    if stream is None:
+        raise PreventUpdate
+    if stream.poll() and validate_rollups:
+        with stream.lock:
+            hierarchy.check()
+    path = (state or {}).get('path', [])
+    if not path or not hierarchy.is_leaf(path):
+        raise PreventUpdate
+
+    position = state.get('position', 0)
+    if cursor and cursor.get('view') == state.get('view'):
+        position = max(position, cursor['position'])
+    rows = stream.since(position, hierarchy.levels[len(path) - 1].key, path[-1])
+    cursor = {'view': state.get('view'), 'position': stream.position}
+    if not len(rows):
+        return dash.no_update, cursor
+
+    chart = hierarchy.level(path).chart
+    trace = make_chart(rows, chart['x'], chart['y'], chart['label'], chart['size'])[0]
+    points = {'x': [trace['x']], 'y': [trace['y']], 'text': [trace['text']]}
+    if chart['size']:
+        points['marker.size'] = [trace['marker']['size']]
+    return [points, [0]], cursor
 
 if __name__ == '__main__':
     app.run_server(debug=True)
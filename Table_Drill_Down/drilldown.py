@@ -0,0 +1,655 @@
+# -*- coding: utf-8 -*-
+"""Indexes and hierarchy definition for the drill-down levels of app_table.py."""
+import functools
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# aggregations that can be kept up to date from running sums and counts
+AGGREGATIONS = ('count', 'sum', 'mean')
+
+
+class ChildIndex(object):
+    """Rows of a child table grouped by their parent key.
+
+    The child table is sorted once by the parent key (stable, so rows keep
+    their order within a parent) and every parent maps to the slice holding
+    its rows. A drill-down is then a dict lookup plus a slice.
+
+    Appended rows wait in a per-parent buffer and are merged into the sorted
+    table once the buffers hold as many rows as the table itself, so appends
+    cost O(rows appended) amortized.
+    """
+
+    def __init__(self, table, key):
+        self.key = key
+        self.table = table.sort_values(key, kind='mergesort').reset_index(drop=True)
+        keys = self.table[key].values
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(keys)]
+        self.slices = dict(zip(keys[starts], zip(starts, stops)))
+        self.pending = {}
+        self.pending_rows = 0
+
+    def children(self, parent):
+        start, stop = self.slices.get(parent, (0, 0))
+        rows = self.table.iloc[start:stop]
+        if parent in self.pending:
+            rows = pd.concat([rows] + self.pending[parent], ignore_index=True)
+        return rows
+
+    def append(self, rows):
+        for parent, group in rows.groupby(self.key, sort=False):
+            self.pending.setdefault(parent, []).append(group)
+        self.pending_rows += len(rows)
+        if self.pending_rows >= max(len(self.table), 1024):
+            self.compact()
+
+    def compact(self):
+        buffered = [group for groups in self.pending.values() for group in groups]
+        if buffered:
+            self.__init__(pd.concat([self.table] + buffered, ignore_index=True), self.key)
+
+
+class RangeIndex(object):
+    """Range predicates over the numeric columns of a table.
+
+    Every queried column gets a sorted copy of its values (built on first
+    use). A predicate (low, high) keeps low <= value < high, None leaves an
+    end open. Each predicate is located by binary search, and only the
+    positions of the narrowest one are checked against the others, so a
+    query costs O(log n) plus the size of its most selective range.
+    """
+
+    def __init__(self, table):
+        self.table = table.reset_index(drop=True)
+        self.sorted = {}
+
+    def _sorted(self, column):
+        if column not in self.sorted:
+            values = self.table[column].values.astype(float)
+            order = np.argsort(values, kind='mergesort')
+            self.sorted[column] = (values[order], order)
+        return self.sorted[column]
+
+    def span(self, column, low=None, high=None):
+        # NaN sorts last and never matches
+        values, order = self._sorted(column)
+        start = 0 if low is None else np.searchsorted(values, low, 'left')
+        stop = np.searchsorted(values, np.inf if high is None else high,
+                               'right' if high is None else 'left')
+        return order[start:max(start, stop)]
+
+    def positions(self, ranges):
+        """Sorted row positions matching every {column: (low, high)} predicate."""
+        if not ranges:
+            return np.arange(len(self.table))
+        spans = sorted(((self.span(column, *bounds), column) for column, bounds in ranges.items()),
+                       key=lambda item: len(item[0]))
+        result = spans[0][0]
+        for _, column in spans[1:]:
+            low, high = ranges[column]
+            values = self.table[column].values[result]
+            keep = ~np.isnan(values.astype(float))
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values < high
+            result = result[keep]
+        return np.sort(result)
+
+    def rows(self, ranges):
+        return self.table.iloc[self.positions(ranges)]
+
+
+class Level(object):
+    """One level of a drill-down hierarchy.
+
+    key: column identifying a row of this level, the next level's table
+        holds it as the parent key.
+    table: attribute table of the level (one row per key, plus the parent
+        key for every level but the first).
+    rollups: {column: (child column, aggregation)} computed from the rows
+        of the next level, e.g. {'Models': ('Model', 'count')}. The
+        aggregation is one of AGGREGATIONS; 'count' counts child rows and
+        'sum'/'mean' treat missing values as 0.
+    chart: keyword arguments for the level's scatter chart (x, y, label,
+        size, title, xaxis, yaxis).
+    """
+
+    def __init__(self, key, table, rollups=None, chart=None):
+        for column, how in (rollups or {}).values():
+            if how not in AGGREGATIONS:
+                raise ValueError('unsupported rollup aggregation {!r} on {!r}, use one of {}'.format(
+                    how, column, ', '.join(AGGREGATIONS)))
+        self.key = key
+        self.table = table
+        self.rollups = rollups or {}
+        self.chart = chart or {}
+
+
+class Hierarchy(object):
+    """Drill-down over a list of Levels, top level first.
+
+    Rollups are kept as a running (sum, count) pair per key and rollup, built
+    bottom-up: a level aggregates the rows of the level below it, including
+    that level's own rollups. append() feeds new rows through the same pairs,
+    so the rollups of every level above stay exact in O(rows appended).
+    A navigation path is the list of keys selected on the levels above the
+    current one.
+    """
+
+    def __init__(self, levels):
+        self.levels = levels
+        self.top = levels[0].table.reset_index(drop=True)
+        self.indexes = [None] * len(levels)
+        # per level with rollups: {key: [sum, count] * number of rollups}
+        self.totals = [None] * len(levels)
+        # per level below the top with rollups: {key: parent key}
+        self.parents = [None] * len(levels)
+        self.version = 0
+        self._range_index = None
+        for depth in reversed(range(len(levels))):
+            level = levels[depth]
+            if depth + 1 < len(levels) and level.rollups:
+                self.totals[depth] = dict(
+                    (key, [0.0] * (2 * len(level.rollups))) for key in level.table[level.key])
+                child = levels[depth + 1].table
+                self._add(depth, self._with_rollups(depth + 1, child), propagate=False)
+            if depth > 0:
+                parent_key = levels[depth - 1].key
+                self.indexes[depth] = ChildIndex(level.table, parent_key)
+                if self.totals[depth] is not None:
+                    self.parents[depth] = dict(zip(level.table[level.key], level.table[parent_key]))
+
+    def level(self, path):
+        return self.levels[len(path)]
+
+    def is_leaf(self, path):
+        return len(path) == len(self.levels) - 1
+
+    def rows(self, path):
+        """Table of the level the navigation path points to."""
+        if not path:
+            return self._with_rollups(0, self.top)
+        return self._with_rollups(len(path), self.indexes[len(path)].children(path[-1]))
+
+    def select(self, ranges):
+        """Top level rows matching {column: (low, high)} range predicates.
+
+        ex.: hierarchy.select({'Average Price': (20000, 30000)})
+        """
+        index = self._range_index
+        if index is None or index[0] != self.version:
+            # rollups change on append, so the index follows the version
+            index = self._range_index = (self.version, RangeIndex(self.rows([])))
+        return index[1].rows(ranges)
+
+    def append(self, depth, rows):
+        """Add attribute rows to a level and update every rollup above it.
+
+        ex.: hierarchy.append(2, new_sales) adds sale dates to their models
+        and updates the models' Sale Dates and, through them, the brands.
+        Raises KeyError for a row whose parent is unknown, or whose key is
+        already loaded on a level with rollups.
+        """
+        level = self.levels[depth]
+        rows = rows.reset_index(drop=True)
+        duplicated, unknown = self._rejected(depth, rows)
+        if duplicated.any():
+            keys = set(rows[level.key][duplicated])
+            raise KeyError('duplicate {}: {}'.format(level.key, ', '.join(map(str, sorted(keys)))))
+        if unknown.any():
+            parent_key = self.levels[depth - 1].key
+            keys = set(rows[parent_key][unknown])
+            raise KeyError('unknown {}: {}'.format(parent_key, ', '.join(map(str, sorted(keys)))))
+        if depth > 0:
+            parent_key = self.levels[depth - 1].key
+            self.indexes[depth].append(rows)
+        else:
+            self.top = pd.concat([self.top, rows], ignore_index=True)
+        if self.totals[depth] is not None:
+            for key in rows[level.key]:
+                self.totals[depth][key] = [0.0] * (2 * len(level.rollups))
+            if depth > 0:
+                self.parents[depth].update(zip(rows[level.key], rows[parent_key]))
+        if depth > 0:
+            self._add(depth - 1, self._with_rollups(depth, rows))
+        self.version += 1
+
+    def rejected(self, depth, rows):
+        """Boolean mask of the rows append() would reject."""
+        duplicated, unknown = self._rejected(depth, rows.reset_index(drop=True))
+        return duplicated | unknown
+
+    def _rejected(self, depth, rows):
+        # keys of a level with rollups identify its rows, appending one again
+        # would count its children twice
+        duplicated = np.zeros(len(rows), dtype=bool)
+        unknown = np.zeros(len(rows), dtype=bool)
+        if self.totals[depth] is not None:
+            keys = rows[self.levels[depth].key]
+            duplicated = (keys.duplicated(keep=False) | keys.isin(self.totals[depth])).values
+        if depth > 0 and self.totals[depth - 1] is not None:
+            unknown = ~rows[self.levels[depth - 1].key].isin(self.totals[depth - 1]).values
+        return duplicated, unknown
+
+    def check(self):
+        """Recomputes every rollup from the full tables and raises an
+        AssertionError if a running total differs from it."""
+        recomputed = None
+        for depth in reversed(range(len(self.levels) - 1)):
+            level = self.levels[depth]
+            if self.totals[depth] is None:
+                recomputed = None
+                continue
+            child = self._table(depth + 1)
+            if recomputed is not None:
+                child = child.assign(**dict(
+                    (name, recomputed.loc[child[self.levels[depth + 1].key], name].values)
+                    for name in recomputed.columns))
+            groups = child.groupby(level.key)
+            keys = list(self._table(depth)[level.key])
+            totals = np.array([self.totals[depth][key] for key in keys], dtype=float).reshape(len(keys), -1)
+            expected = np.zeros_like(totals)
+            for i, (name, (column, how)) in enumerate(level.rollups.items()):
+                expected[:, 2 * i + 1] = groups.size().reindex(keys, fill_value=0).values
+                if how != 'count':
+                    expected[:, 2 * i] = groups[column].apply(lambda values: values.fillna(0).sum()).reindex(
+                        keys, fill_value=0).values
+            wrong = ~np.isclose(totals, expected).all(axis=1)
+            if wrong.any():
+                raise AssertionError('rollups of {} differ from a full recompute: {}'.format(
+                    level.key, ', '.join(str(key) for key in np.array(keys, dtype=object)[wrong])))
+            recomputed = self._values(depth, keys)
+
+    def _table(self, depth):
+        # every row of a level, appended ones included
+        if depth == 0:
+            return self.top
+        index = self.indexes[depth]
+        buffered = [group for groups in index.pending.values() for group in groups]
+        return pd.concat([index.table] + buffered, ignore_index=True)
+
+    def _values(self, depth, keys):
+        # rollup values of the given keys of a level, from their running totals
+        level = self.levels[depth]
+        totals = self.totals[depth]
+        acc = np.array([totals[key] for key in keys], dtype=float).reshape(len(keys), -1)
+        values = {}
+        for i, (name, (column, how)) in enumerate(level.rollups.items()):
+            total, count = acc[:, 2 * i], acc[:, 2 * i + 1]
+            if how == 'count':
+                values[name] = count.astype(int)
+            elif how == 'sum':
+                values[name] = total.round(2)
+            else:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values[name] = np.where(count > 0, total / count, np.nan).round(2)
+        return pd.DataFrame(values, index=keys, columns=list(level.rollups))
+
+    def _with_rollups(self, depth, table):
+        if self.totals[depth] is None:
+            return table
+        values = self._values(depth, list(table[self.levels[depth].key]))
+        return table.assign(**dict((name, values[name].values) for name in values.columns))
+
+    def _add(self, depth, rows, before=None, propagate=True):
+        # Folds rows of level depth + 1 into the running totals of level depth.
+        # Without ``before`` the rows are new children; with it they are
+        # existing children whose rollup columns changed from ``before``.
+        level = self.levels[depth]
+        if self.totals[depth] is None:
+            return
+        totals = self.totals[depth]
+        keys = rows[level.key].values
+        changed = list(pd.unique(keys))
+        old = self._values(depth, changed) if propagate and depth > 0 else None
+        for i, (name, (column, how)) in enumerate(level.rollups.items()):
+            if before is None:
+                counts = pd.Series(1, index=keys).groupby(level=0).sum()
+                for key, count in counts.items():
+                    totals[key][2 * i + 1] += count
+                if how == 'count':
+                    continue
+                sums = rows[column].fillna(0).groupby(keys).sum()
+            elif column in before:
+                delta = rows[column].fillna(0).values - before[column].fillna(0).values
+                sums = pd.Series(delta).groupby(keys).sum()
+            else:
+                continue
+            for key, total in sums.items():
+                totals[key][2 * i] += total
+        if old is not None:
+            new = self._values(depth, changed)
+            new[self.levels[depth - 1].key] = [self.parents[depth][key] for key in changed]
+            self._add(depth - 1, new, before=old)
+
+
+class ViewCache(object):
+    """Small LRU of rendered views, keyed by the state they were built from.
+
+    Concurrent requests for the same key share one build: the first caller
+    builds, the others wait for its result instead of rebuilding.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.builds = 0
+        self._entries = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def cached(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            return self._entries.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            done = self._building.get(key)
+            owner = done is None
+            if owner:
+                done = self._building[key] = threading.Event()
+        if not owner:
+            done.wait()
+            with self._lock:
+                if key in self._entries:
+                    return self._entries[key]
+            # the build we waited for failed, try again on our own
+            return build()
+
+        try:
+            value = build()
+            with self._lock:
+                self.builds += 1
+                self._entries[key] = value
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                del self._building[key]
+            done.set()
+
+
+class LatestRequests(object):
+    """Latest-wins tickets of the requests of each browser session.
+
+    A request takes a ticket, waits a short window, and is superseded if a
+    newer request of the same session arrived meanwhile, so a burst of
+    different events (filters changed in a row, Back pressed twice) builds
+    only its last view.
+    """
+
+    def __init__(self, window=0.05, sessions=10000):
+        self.window = window
+        self.sessions = sessions
+        self._tickets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, session):
+        with self._lock:
+            ticket = self._tickets.pop(session, 0) + 1
+            self._tickets[session] = ticket
+            while len(self._tickets) > self.sessions:
+                self._tickets.popitem(last=False)
+            return ticket
+
+    def superseded(self, session, ticket):
+        time.sleep(self.window)
+        with self._lock:
+            return self._tickets.get(session, ticket) != ticket
+
+
+class TailReader(object):
+    """Rows appended to a CSV file since the previous read.
+
+    Only complete lines are read, a line still being written is picked up by
+    a later call. A header line at the start of the file is skipped, and a
+    file that shrinks (truncated or replaced) is read again from the start.
+    read() does not move past the rows it returns, advance() does once they
+    have been applied, so a batch that fails is read again. Lines that cannot
+    be parsed are logged and skipped.
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.offset = 0
+        self._end = 0
+
+    def read(self):
+        self._end = self.offset
+        try:
+            if os.path.getsize(self.path) < self.offset:
+                self.offset = 0
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                chunk = f.read()
+        except (IOError, OSError):
+            return None
+        end = chunk.rfind(b'\n') + 1
+        self._end = self.offset + end
+        if not end:
+            return None
+        lines = chunk[:end]
+        if self.offset == 0:
+            first, _, rest = lines.partition(b'\n')
+            if first.decode('utf-8-sig').strip().split(',') == self.columns:
+                lines = rest
+        if not lines.strip():
+            return None
+        try:
+            return self._parse(lines)
+        except (ValueError, UnicodeDecodeError):
+            # pandas' ParserError is a ValueError; find the bad lines one by one
+            parsed = []
+            for number, line in enumerate(lines.splitlines(True)):
+                if not line.strip():
+                    continue
+                try:
+                    parsed.append(self._parse(line))
+                except (ValueError, UnicodeDecodeError) as error:
+                    log.warning('%s: skipped line %d after offset %d: %s', self.path, number + 1, self.offset, error)
+            return pd.concat(parsed, ignore_index=True) if parsed else None
+
+    def _parse(self, lines):
+        rows = pd.read_csv(io.BytesIO(lines), header=None, names=self.columns)
+        if rows.shape[1] != len(self.columns) or rows.index.nlevels > 1:
+            raise ValueError('expected {} fields'.format(len(self.columns)))
+        return rows
+
+    def advance(self):
+        """Moves past the rows returned by the last read()."""
+        self.offset = self._end
+
+
+class Stream(object):
+    """Feeds the rows of a TailReader into one level of a Hierarchy.
+
+    Every ingested row gets a position, and the last ``keep`` rows are kept
+    so clients can ask for what arrived after the position they have drawn.
+    Hold ``lock`` while reading the hierarchy to see no half-applied batch.
+    """
+
+    def __init__(self, hierarchy, depth, reader, keep=100000):
+        self.hierarchy = hierarchy
+        self.depth = depth
+        self.reader = reader
+        self.keep = keep
+        self.position = 0
+        self.lock = threading.RLock()
+        self._log = deque()
+        self._logged = 0
+
+    def poll(self):
+        """Ingests the rows appended since the last poll, returns their count.
+
+        Rows the hierarchy rejects (unknown parent, duplicate key) are logged
+        and dropped, the rest of the batch is ingested.
+        """
+        with self.lock:
+            rows = self.reader.read()
+            if rows is None or not len(rows):
+                self.reader.advance()
+                return 0
+            rejected = self.hierarchy.rejected(self.depth, rows)
+            if rejected.any():
+                log.warning('%s: dropped %d rows rejected by the hierarchy:\n%s',
+                            self.reader.path, rejected.sum(), rows[rejected].to_string())
+                rows = rows[~rejected].reset_index(drop=True)
+            if len(rows):
+                self.hierarchy.append(self.depth, rows)
+            self.reader.advance()
+            if not len(rows):
+                return 0
+            self._log.append((self.position, rows))
+            self.position += len(rows)
+            self._logged += len(rows)
+            while self._logged - len(self._log[0][1]) >= self.keep:
+                self._logged -= len(self._log.popleft()[1])
+            return len(rows)
+
+    def since(self, position, column, value):
+        """Rows ingested from ``position`` on whose ``column`` equals ``value``."""
+        with self.lock:
+            chunks = [(start, rows) for start, rows in self._log if start + len(rows) > position]
+        parts = []
+        for start, rows in chunks:
+            rows = rows.iloc[max(0, position - start):]
+            parts.append(rows[rows[column] == value])
+        if not parts:
+            return pd.DataFrame(columns=self.reader.columns)
+        return pd.concat(parts, ignore_index=True)
+
+
+class JobPool(object):
+    """Chunked computations run in a process pool, looked up by job id.
+
+    submit() maps ``work`` over the chunks in worker processes and returns
+    at once; status() reports the share of finished chunks and, once all are
+    done, ``combine`` of their results. The results are combined (in this
+    process) and released as soon as the last chunk completes, whether the
+    job is polled or not. Submitting an id that is running or finished joins
+    that job. At most ``keep`` jobs are kept and none longer than ``max_age``
+    seconds, the oldest go first whatever their state (the pending chunks of
+    a running one are cancelled); discard() drops a job whose result has been
+    stored elsewhere. ``work`` must be picklable (a module level function).
+    """
+
+    def __init__(self, workers=None, keep=32, max_age=600):
+        self.workers = workers
+        self.keep = keep
+        self.max_age = max_age
+        self._executor = None
+        self._jobs = OrderedDict()
+        # re-entrant: a chunk that is already done runs its callback at once
+        self._lock = threading.RLock()
+
+    def submit(self, job_id, work, chunks, combine):
+        with self._lock:
+            self._evict()
+            job = self._jobs.get(job_id)
+            if job is not None and job['state'] != 'error':
+                return job_id
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers)
+            self._jobs.pop(job_id, None)
+            job = self._jobs[job_id] = {'state': 'running', 'finished': 0, 'total': len(chunks),
+                                        'results': [None] * len(chunks), 'combine': combine,
+                                        'result': None, 'futures': [], 'created': time.time()}
+            self._evict()
+            for i, chunk in enumerate(chunks):
+                future = self._executor.submit(work, chunk)
+                job['futures'].append(future)
+                future.add_done_callback(functools.partial(self._chunk_done, job, i))
+            if not chunks:
+                self._combine(job)
+        return job_id
+
+    def _chunk_done(self, job, i, future):
+        with self._lock:
+            if job['state'] != 'running' or future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                self._fail(job, error)
+                return
+            job['results'][i] = future.result()
+            job['finished'] += 1
+            if job['finished'] < job['total']:
+                return
+        self._combine(job)
+
+    def _combine(self, job):
+        with self._lock:
+            results, job['results'], job['futures'] = job['results'], None, None
+        try:
+            result = job['combine'](results)
+        except Exception as error:
+            with self._lock:
+                self._fail(job, error)
+            return
+        with self._lock:
+            if job['state'] == 'running':
+                job['state'], job['result'] = 'done', result
+
+    def _fail(self, job, error):
+        for future in job['futures'] or []:
+            future.cancel()
+        job['state'], job['result'] = 'error', error
+        job['results'] = job['futures'] = None
+
+    def _evict(self):
+        # oldest first, by age then by count
+        oldest = time.time() - self.max_age
+        while self._jobs:
+            job_id, job = next(iter(self._jobs.items()))
+            if job['created'] >= oldest and len(self._jobs) <= self.keep:
+                break
+            self._drop(job_id)
+
+    def _drop(self, job_id):
+        job = self._jobs.pop(job_id)
+        for future in job['futures'] or []:
+            future.cancel()
+        job['state'] = 'dropped'
+        job['results'] = job['futures'] = job['result'] = None
+
+    def discard(self, job_id):
+        """Forgets a job, ex.: once its result is cached elsewhere."""
+        with self._lock:
+            if job_id in self._jobs:
+                self._drop(job_id)
+
+    def status(self, job_id):
+        """(state, progress, result) of a job, state is None for an unknown id
+        and else one of 'running', 'done' or 'error' (result is the exception)."""
+        with self._lock:
+            self._evict()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None, 0.0, None
+            if job['state'] == 'running':
+                return 'running', float(job['finished']) / max(job['total'], 1), None
+            return job['state'], 1.0, job['result']
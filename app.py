@@ -5,7 +5,12 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 
+import callback_metrics
+import static_assets
+
 app = dash.Dash()
+# timings and payload sizes of the callbacks at /metrics
+callback_metrics.instrument(app)
 
 all_options = {
     'America': ['New York City', 'San Francisco', 'Cincinnati'],
@@ -24,8 +29,8 @@ city_data = {
 
 app.title = 'Dash Tutorial'
 
-# Boostrap CSS.
-app.css.append_css({'external_url': 'https://codepen.io/amyoshino/pen/jzXypZ.css'})
+# Bootstrap grid CSS, served locally once copied to static/grid.css
+static_assets.install(app)
 
 app.layout = html.Div(
     html.Div([
@@ -33,7 +38,7 @@ app.layout = html.Div(
             html.H1(children='Hello World',
                     className = "nine columns"),
             html.Img(
-                src="http://test.fulcrumanalytics.com/wp-content/uploads/2015/10/Fulcrum-logo_840X144.png",
+                src=static_assets.url('logo.png'),
                 className='three columns',
                 style={
                     'height': '14%',
@@ -101,65 +106,38 @@ app.layout = html.Div(
 def set_cities_options(selected_country):
     return [{'label': i, 'value': i} for i in all_options[selected_country]]
 
-@app.callback(
-    dash.dependencies.Output('example-graph', 'figure'),
-    [dash.dependencies.Input('Cities', 'values')])
-def update_graph_src(selector):
-    data = []
-    for city in selector:
-        data.append({'x': city_data[city]['x'], 'y': city_data[city]['y'],
-                    'type': 'bar', 'name': city})
-    figure = {
-        'data': data,
-        'layout': {
-            'title': 'Graph 1',
-            'xaxis' : dict(
-                title='x Axis',
-                titlefont=dict(
-                family='Courier New, monospace',
-                size=20,
-                color='#7f7f7f'
-            )),
-            'yaxis' : dict(
-                title='y Axis',
-                titlefont=dict(
-                family='Helvetica, monospace',
-                size=20,
-                color='#7f7f7f'
-            ))
-        }
-    }
-    return figure
+# Axis styles shared by both figures, built once
+xaxis = dict(
+    title='x Axis',
+    titlefont=dict(
+    family='Courier New, monospace',
+    size=20,
+    color='#7f7f7f'
+))
+yaxis = dict(
+    title='y Axis',
+    titlefont=dict(
+    family='Helvetica, monospace',
+    size=20,
+    color='#7f7f7f'
+))
+layout_graph_1 = {'title': 'Graph 1', 'xaxis': xaxis, 'yaxis': yaxis}
+layout_graph_2 = {'title': 'Graph 1', 'xaxis': xaxis, 'yaxis': yaxis}
 
+# Both figures are returned by one callback: one request per change of the
+# Cities checklist and one pass over the selected cities
 @app.callback(
-    dash.dependencies.Output('example-graph-2', 'figure'),
+    [dash.dependencies.Output('example-graph', 'figure'),
+     dash.dependencies.Output('example-graph-2', 'figure')],
     [dash.dependencies.Input('Cities', 'values')])
 def update_graph_src(selector):
-    data = []
+    bars = []
+    lines = []
     for city in selector:
-        data.append({'x': city_data[city]['x'], 'y': city_data[city]['y'],
-                    'type': 'line', 'name': city})
-    figure = {
-        'data': data,
-        'layout': {
-            'title': 'Graph 1',
-            'xaxis' : dict(
-                title='x Axis',
-                titlefont=dict(
-                family='Courier New, monospace',
-                size=20,
-                color='#7f7f7f'
-            )),
-            'yaxis' : dict(
-                title='y Axis',
-                titlefont=dict(
-                family='Helvetica, monospace',
-                size=20,
-                color='#7f7f7f'
-            ))
-        }
-    }
-    return figure
+        x, y = city_data[city]['x'], city_data[city]['y']
+        bars.append({'x': x, 'y': y, 'type': 'bar', 'name': city})
+        lines.append({'x': x, 'y': y, 'type': 'line', 'name': city})
+    return {'data': bars, 'layout': layout_graph_1}, {'data': lines, 'layout': layout_graph_2}
 
 if __name__ == '__main__':
     app.run_server(debug=True)
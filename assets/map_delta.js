@@ -0,0 +1,28 @@
+// Applies the small selection delta sent by ex4.py's map_selection callback
+// to the map figure the browser already holds, so selecting rows never
+// re-sends the trace.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    hotspots: {
+        apply_delta: function(base, delta) {
+            if (!base) {
+                return window.dash_clientside.no_update;
+            }
+            var trace = Object.assign({}, base.data[0]);
+            if (delta && delta.keys && delta.keys.length) {
+                var wanted = {};
+                delta.keys.forEach(function(key) { wanted[key] = true; });
+                trace.selectedpoints = [];
+                (trace.customdata || []).forEach(function(key, i) {
+                    if (wanted[key]) {
+                        trace.selectedpoints.push(i);
+                    }
+                });
+                trace.selected = {marker: delta.selected || {}};
+                trace.unselected = {marker: delta.unselected || {}};
+            } else {
+                trace.selectedpoints = null;
+            }
+            return Object.assign({}, base, {data: [trace].concat(base.data.slice(1))});
+        }
+    }
+});
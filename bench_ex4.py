@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Latency, peak memory and payload size of ex4.py's callbacks by data size.
+
+The callbacks are called directly (no HTTP) on synthetic datasets built by
+synthetic_hotspots.py. The figure cache is disabled so every call measures
+a full rebuild.
+
+    python bench_ex4.py --sizes 3000 30000 300000 --repeat 5
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import plotly
+
+import ex4
+import hotspots
+import synthetic_hotspots
+from figure_cache import FigureCache
+
+SIZES = [3000, 30000, 300000, 1000000, 5000000]
+
+
+def use_store(store):
+    # rebuilds ex4's dataset and indexes around ``store``
+    ex4.store = store
+    ex4.filter_index = hotspots.FilterIndex(store, ('Borough', 'Type'))
+    ex4.count_cube = hotspots.CountCube(store, ('Borough', 'Type', 'Provider'))
+    ex4.trace = hotspots.TraceColumns(store)
+    ex4.spatial = hotspots.SpatialIndex(store)
+    ex4.map_cache = FigureCache(max_bytes=0)
+
+
+def scenarios(store):
+    types = list(store.labels['Type'])
+    boroughs = list(store.labels['Borough'])
+    ids = ex4.filter_index.rows(boroughs, types)
+    selected = [int(i) for i in ids[:50]]
+    # what the browser reports after zooming in on Midtown
+    zoomed = {'mapbox.zoom': 15, 'mapbox.center': {'lon': -73.985, 'lat': 40.748},
+              'mapbox._derived': {'coordinates': [[-73.9914, 40.7521], [-73.9786, 40.7521],
+                                                  [-73.9786, 40.7439], [-73.9914, 40.7439]]}}
+
+    def raw(callback):
+        # the undecorated function registered with @app.callback
+        return getattr(callback, '__wrapped__', callback)
+
+    return [
+        ('update_selected_row_indices', raw(ex4.update_selected_row_indices),
+         (types, boroughs, 0, ex4.PAGE_SIZE, [{'column_id': 'Name', 'direction': 'asc'}], '')),
+        ('map_figure (zoom 10)', raw(ex4.map_figure), (types, boroughs, None)),
+        ('map_figure (zoom 15)', raw(ex4.map_figure), (types, boroughs, zoomed)),
+        ('map_selection', raw(ex4.map_selection), (selected, types, boroughs, None)),
+        ('update_figure', raw(ex4.update_figure), (types, boroughs)),
+        ('gen_map (all points)', ex4.gen_map, (ids,)),
+    ]
+
+
+def payload_size(result):
+    if isinstance(result, str):
+        return len(result)
+    return len(json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def measure(func, args, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return np.median(timings), peak, payload_size(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    source = hotspots.load_hotspots('nyc-wi-fi-hotspot-locations.csv')
+    print('{:>9}  {:<28} {:>11} {:>11} {:>13}'.format(
+        'rows', 'callback', 'median ms', 'peak MB', 'payload KB'))
+    for size in args.sizes:
+        use_store(synthetic_hotspots.generate(source, size, args.seed))
+        for name, func, call_args in scenarios(ex4.store):
+            # callbacks may read dash.callback_context, which needs a request
+            with ex4.server.test_request_context():
+                latency, peak, payload = measure(func, call_args, args.repeat)
+            print('{:>9}  {:<28} {:>11.2f} {:>11.2f} {:>13.1f}'.format(
+                size, name, latency * 1e3, peak / 1e6, payload / 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""Per-callback timings and payload sizes of a Dash app, as Prometheus text.
+
+    app = dash.Dash(__name__)
+    callback_metrics.instrument(app)    # before the first @app.callback
+
+Every update request records, by callback (its output id), the wall time of
+the request, the time spent in the callback function, the time spent
+validating and encoding its result (Dash serializes inside the registered
+callback), the request and response sizes, and the calls by HTTP status.
+Requests naming no registered callback are all counted as "unknown".
+GET /metrics serves them in the Prometheus text format.
+
+With profile_slowest=N (or CALLBACK_PROFILE=N in the environment) updates run
+under cProfile and the N slowest profiles are served at /metrics/profiles.
+Other statistics of the app (ex.: FigureCache.stats) can be added to /metrics
+with expose(). Metrics are kept per server process.
+"""
+import cProfile
+import functools
+import heapq
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+
+import flask
+from dash.exceptions import PreventUpdate
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _labels(labels):
+    escaped = ('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+class Histogram(object):
+    """Cumulative bucket counts, sum and count by label set."""
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def lines(self):
+        yield '# HELP {} {}'.format(self.name, self.help)
+        yield '# TYPE {} histogram'.format(self.name)
+        for labels, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                yield '{}_bucket{} {}'.format(self.name, _labels(labels + (('le', bound),)), count)
+            yield '{}_bucket{} {}'.format(self.name, _labels(labels + (('le', '+Inf'),)), series[-1])
+            yield '{}_sum{} {!r}'.format(self.name, _labels(labels), series[-2])
+            yield '{}_count{} {}'.format(self.name, _labels(labels), series[-1])
+
+
+class Counter(object):
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def inc(self, labels):
+        self._values[labels] = self._values.get(labels, 0) + 1
+
+    def lines(self):
+        yield '# HELP {} {}'.format(self.name, self.help)
+        yield '# TYPE {} counter'.format(self.name)
+        for labels, value in sorted(self._values.items()):
+            yield '{}{} {}'.format(self.name, _labels(labels), value)
+
+
+class CallbackMetrics(object):
+
+    def __init__(self, app, profile_slowest=0):
+        self.app = app
+        self.profile_slowest = profile_slowest
+        self.requests = Counter('dash_callback_requests_total', 'Update requests by callback and HTTP status.')
+        self.seconds = Histogram('dash_callback_seconds',
+                                 'Update time by callback and phase (request, function, serialization).',
+                                 SECONDS)
+        self.request_bytes = Histogram('dash_callback_request_bytes', 'Update request body size.', BYTES)
+        self.response_bytes = Histogram('dash_callback_response_bytes', 'Update response body size.', BYTES)
+        self.profiles = []
+        self.sources = []
+        self._sequence = itertools.count()
+        self._current = threading.local()
+        self._lock = threading.Lock()
+
+    def install(self):
+        app = self.app
+        register = app.callback
+
+        # every callback function registered from now on is timed
+        @functools.wraps(register)
+        def callback(*args, **kwargs):
+            decorator = register(*args, **kwargs)
+
+            def wrap(func):
+                @functools.wraps(func)
+                def timed(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return func(*args, **kwargs)
+                    finally:
+                        # also called outside of update requests, ex.: by benchmarks
+                        elapsed = time.perf_counter() - start
+                        self._current.function = getattr(self._current, 'function', 0.0) + elapsed
+                return decorator(timed)
+            return wrap
+        app.callback = callback
+
+        for rule in app.server.url_map.iter_rules():
+            if rule.rule.endswith('_dash-update-component'):
+                endpoint = rule.endpoint
+                app.server.view_functions[endpoint] = self._measure(app.server.view_functions[endpoint])
+
+        app.server.add_url_rule('/metrics', 'callback_metrics', self.serve_metrics)
+        app.server.add_url_rule('/metrics/profiles', 'callback_profiles', self.serve_profiles)
+        return self
+
+    def _timed_entry(self, output):
+        # Dash's own wrapper around the function validates and encodes the
+        # result, its time minus the function's is the serialization time
+        entry = self.app.callback_map.get(output)
+        if entry is None or getattr(entry['callback'], 'callback_metrics', False):
+            return
+        registered = entry['callback']
+
+        @functools.wraps(registered)
+        def encoded(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return registered(*args, **kwargs)
+            finally:
+                self._current.encoded = time.perf_counter() - start
+        encoded.callback_metrics = True
+        entry['callback'] = encoded
+
+    def _measure(self, view):
+        @functools.wraps(view)
+        def measured(*args, **kwargs):
+            body = flask.request.get_json(silent=True) or {}
+            output = body.get('output', '')
+            # the label comes from the request, only registered outputs get
+            # their own series so clients cannot add any
+            if not isinstance(output, str) or output not in self.app.callback_map:
+                output = 'unknown'
+            self._timed_entry(output)
+            self._current.function = 0.0
+            self._current.encoded = None
+            profile = cProfile.Profile() if self.profile_slowest else None
+            if profile is not None:
+                try:
+                    profile.enable()
+                except ValueError:
+                    # another profiler runs in this process
+                    profile = None
+
+            response = None
+            status = 500
+            start = time.perf_counter()
+            try:
+                response = view(*args, **kwargs)
+                status = getattr(response, 'status_code', 200)
+                return response
+            except PreventUpdate:
+                status = 204
+                raise
+            except Exception as error:
+                status = getattr(error, 'code', 500)
+                raise
+            finally:
+                wall = time.perf_counter() - start
+                if profile is not None:
+                    profile.disable()
+                self._record(output, status, wall, len(flask.request.get_data()), response, profile)
+        return measured
+
+    def _record(self, output, status, wall, request_size, response, profile):
+        function = self._current.function
+        encoded = self._current.encoded
+        response_size = None
+        if response is not None and hasattr(response, 'get_data') and not response.is_streamed:
+            response_size = len(response.get_data())
+        with self._lock:
+            self.requests.inc((('callback', output), ('status', status)))
+            self.seconds.observe((('callback', output), ('phase', 'request')), wall)
+            self.seconds.observe((('callback', output), ('phase', 'function')), function)
+            if encoded is not None:
+                self.seconds.observe((('callback', output), ('phase', 'serialization')), max(0.0, encoded - function))
+            self.request_bytes.observe((('callback', output),), request_size)
+            if response_size is not None:
+                self.response_bytes.observe((('callback', output),), response_size)
+            if profile is not None:
+                self._keep_profile(output, wall, profile)
+
+    def _keep_profile(self, output, wall, profile):
+        # min-heap of the slowest updates, the text is only rendered for the
+        # ones that make it in
+        if len(self.profiles) >= self.profile_slowest and wall <= self.profiles[0][0]:
+            return
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats('cumulative').print_stats(30)
+        entry = (wall, next(self._sequence), output, text.getvalue())
+        if len(self.profiles) < self.profile_slowest:
+            heapq.heappush(self.profiles, entry)
+        else:
+            heapq.heapreplace(self.profiles, entry)
+
+    def expose(self, prefix, stats, labels=(), counters=()):
+        """Serves the numbers of the dict returned by ``stats()`` at /metrics.
+
+        Each key becomes the metric <prefix>_<key> with ``labels``, a counter
+        (suffixed _total) for the keys in ``counters`` and a gauge otherwise.
+        ex.: metrics.expose('figure_cache', cache.stats, (('cache', 'map'),),
+                            counters=('hits', 'misses', 'evictions'))
+        """
+        self.sources.append((prefix, stats, tuple(labels), frozenset(counters)))
+
+    def _source_lines(self):
+        # {metric name: (type, [(labels, value)])}, sources sharing a prefix
+        # are listed under one TYPE line
+        metrics = {}
+        for prefix, stats, labels, counters in self.sources:
+            for key, value in stats().items():
+                if key in counters:
+                    name, kind = '{}_{}_total'.format(prefix, key), 'counter'
+                else:
+                    name, kind = '{}_{}'.format(prefix, key), 'gauge'
+                metrics.setdefault(name, (kind, []))[1].append((labels, value))
+        for name, (kind, series) in sorted(metrics.items()):
+            yield '# TYPE {} {}'.format(name, kind)
+            for labels, value in sorted(series):
+                yield '{}{} {}'.format(name, _labels(labels) if labels else '', value)
+
+    def serve_metrics(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.seconds, self.request_bytes, self.response_bytes):
+                lines.extend(metric.lines())
+        lines.extend(self._source_lines())
+        return flask.Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    def serve_profiles(self):
+        with self._lock:
+            profiles = sorted(self.profiles, reverse=True)
+        text = ''.join('=== {} ({:.1f} ms)\n{}\n'.format(output, wall * 1e3, stats)
+                       for wall, _, output, stats in profiles)
+        return flask.Response(text or 'no profiles, set CALLBACK_PROFILE=N\n', mimetype='text/plain')
+
+
+def instrument(app, profile_slowest=None):
+    """Installs CallbackMetrics on ``app``, call it before registering callbacks."""
+    if profile_slowest is None:
+        profile_slowest = int(os.environ.get('CALLBACK_PROFILE', 0))
+    return CallbackMetrics(app, profile_slowest).install()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Brotli and gzip compression of Dash's update and layout responses.
+
+    app = dash.Dash(__name__)
+    compression.compress(app)
+
+Dash's own compression (Flask-Compress) is pinned to gzip. This hook runs
+before it on the endpoints whose payloads grow with the data, prefers brotli
+when the client accepts it and the brotli package is installed, and skips
+responses under ``min_size`` bytes. Dash keeps compressing everything it
+does not handle (scripts, styles). A response with a strong ETag (ex.: the
+layout served by layout_cache.py) is compressed once per ETag and encoding.
+The defaults can be changed with COMPRESS_MIN_SIZE, COMPRESS_GZIP_LEVEL and
+COMPRESS_BROTLI_QUALITY.
+"""
+import gzip
+import os
+import threading
+
+import flask
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENDPOINTS = ('_dash-update-component', '_dash-layout')
+# compressed bodies kept by (ETag, encoding)
+ETAG_CACHE_SIZE = 32
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header value."""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    if brotli is not None and accepted.get('br', wildcard) > 0:
+        return 'br'
+    if accepted.get('gzip', wildcard) > 0:
+        return 'gzip'
+    return None
+
+
+def compress(app, min_size=None, gzip_level=None, brotli_quality=None, endpoints=ENDPOINTS):
+    """Compresses the responses of ``endpoints`` of the Dash ``app``."""
+    env = os.environ.get
+    min_size = int(env('COMPRESS_MIN_SIZE', 1024)) if min_size is None else min_size
+    gzip_level = int(env('COMPRESS_GZIP_LEVEL', 6)) if gzip_level is None else gzip_level
+    brotli_quality = int(env('COMPRESS_BROTLI_QUALITY', 4)) if brotli_quality is None else brotli_quality
+    rules = set(rule.rule for rule in app.server.url_map.iter_rules()
+                if rule.rule.endswith(tuple(endpoints)))
+    by_etag = {}
+    lock = threading.Lock()
+
+    @app.server.after_request
+    def compress_response(response):
+        rule = flask.request.url_rule
+        if rule is None or rule.rule not in rules:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+        encoding = choose_encoding(flask.request.headers.get('Accept-Encoding', ''))
+        data = response.get_data()
+        if encoding is None or len(data) < min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        key = (etag, encoding) if etag and not weak else None
+        compressed = by_etag.get(key) if key else None
+        if compressed is None:
+            if encoding == 'br':
+                compressed = brotli.compress(data, quality=brotli_quality)
+            else:
+                compressed = gzip.compress(data, gzip_level, mtime=0)
+            if key:
+                with lock:
+                    if len(by_etag) >= ETAG_CACHE_SIZE:
+                        del by_etag[next(iter(by_etag))]
+                    by_etag[key] = compressed
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        # the body differs from the uncompressed one, its validator is weak
+        if key:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return compress_response
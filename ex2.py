@@ -5,10 +5,12 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 
+import static_assets
+
 app = dash.Dash()
 
-# Boostrap CSS.
-app.css.append_css({'external_url': 'https://codepen.io/amyoshino/pen/jzXypZ.css'})  # noqa: E501
+# Bootstrap grid CSS, served locally once copied to static/grid.css
+static_assets.install(app)
 
 app.layout = html.Div(
     html.Div([
@@ -17,7 +19,7 @@ app.layout = html.Div(
                 html.H1(children='Hello World',
                         className='nine columns'),
                 html.Img(
-                    src="http://test.fulcrumanalytics.com/wp-content/uploads/2015/10/Fulcrum-logo_840X144.png",
+                    src=static_assets.url('logo.png'),
                     className='three columns',
                     style={
                         'height': '15%',
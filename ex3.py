@@ -5,10 +5,12 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 
+import static_assets
+
 app = dash.Dash()
 
-# Boostrap CSS.
-app.css.append_css({'external_url': 'https://codepen.io/amyoshino/pen/jzXypZ.css'})  # noqa: E501
+# Bootstrap grid CSS, served locally once copied to static/grid.css
+static_assets.install(app)
 
 app.layout = html.Div(
     html.Div([
@@ -17,7 +19,7 @@ app.layout = html.Div(
                 html.H1(children='Hello World',
                         className='nine columns'),
                 html.Img(
-                    src="http://test.fulcrumanalytics.com/wp-content/uploads/2015/10/Fulcrum-logo_840X144.png",
+                    src=static_assets.url('logo.png'),
                     className='three columns',
                     style={
                         'height': '9%',
@@ -85,67 +87,39 @@ app.layout = html.Div(
     ], className='ten columns offset-by-one')
 )
 
-@app.callback(
-    dash.dependencies.Output('example-graph', 'figure'),
-    [dash.dependencies.Input('Cities', 'values')])
-def update_image_src(selector):
-    data = []
-    if 'SF' in selector:
-        data.append({'x': [1, 2, 3], 'y': [4, 1, 2], 'type': 'bar', 'name': 'SF'})
-    if 'MT' in selector:
-        data.append({'x': [1, 2, 3], 'y': [2, 4, 5], 'type': 'bar', 'name': u'Montréal'})
-    figure = {
-        'data': data,
-        'layout': {
-            'title': 'Graph 1',
-            'xaxis' : dict(
-                title='x Axis',
-                titlefont=dict(
-                family='Courier New, monospace',
-                size=20,
-                color='#7f7f7f'
-            )),
-            'yaxis' : dict(
-                title='y Axis',
-                titlefont=dict(
-                family='Helvetica, monospace',
-                size=20,
-                color='#7f7f7f'
-            ))
-        }
-    }
-    return figure
+# Axis styles shared by both figures, built once
+xaxis = dict(
+    title='x Axis',
+    titlefont=dict(
+    family='Courier New, monospace',
+    size=20,
+    color='#7f7f7f'
+))
+yaxis = dict(
+    title='y Axis',
+    titlefont=dict(
+    family='Helvetica, monospace',
+    size=20,
+    color='#7f7f7f'
+))
+layout_graph_1 = {'title': 'Graph 1', 'xaxis': xaxis, 'yaxis': yaxis}
+layout_graph_2 = {'title': 'Graph 2', 'xaxis': xaxis, 'yaxis': yaxis}
 
+# Both figures are returned by one callback: one request per change of the
+# Cities checklist and one pass over the selected cities
 @app.callback(
-    dash.dependencies.Output('example-graph-2', 'figure'),
+    [dash.dependencies.Output('example-graph', 'figure'),
+     dash.dependencies.Output('example-graph-2', 'figure')],
     [dash.dependencies.Input('Cities', 'values')])
 def update_image_src(selector):
-    data = []
+    cities = []
     if 'SF' in selector:
-        data.append({'x': [1, 2, 3], 'y': [4, 1, 2], 'type': 'line', 'name': 'SF'})
+        cities.append(('SF', [1, 2, 3], [4, 1, 2]))
     if 'MT' in selector:
-        data.append({'x': [1, 2, 3], 'y': [2, 4, 5], 'type': 'line', 'name': u'Montréal'})
-    figure = {
-        'data': data,
-        'layout': {
-            'title': 'Graph 2',
-            'xaxis' : dict(
-                title='x Axis',
-                titlefont=dict(
-                family='Courier New, monospace',
-                size=20,
-                color='#7f7f7f'
-            )),
-            'yaxis' : dict(
-                title='y Axis',
-                titlefont=dict(
-                family='Helvetica, monospace',
-                size=20,
-                color='#7f7f7f'
-            ))
-        }
-    }
-    return figure
+        cities.append((u'Montréal', [1, 2, 3], [2, 4, 5]))
+    bars = [{'x': x, 'y': y, 'type': 'bar', 'name': name} for name, x, y in cities]
+    lines = [{'x': x, 'y': y, 'type': 'line', 'name': name} for name, x, y in cities]
+    return {'data': bars, 'layout': layout_graph_1}, {'data': lines, 'layout': layout_graph_2}
 
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -4,26 +4,73 @@
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-import dash_table_experiments as dt
-import pandas as pd
+import dash_table as dt
+import gc
+import numpy as np
 
+import callback_metrics
+import compression
+import hotspots
+import layout_cache
+import static_assets
+from figure_cache import FigureCache, fingerprint
 from plotly import graph_objs as go
 from plotly.graph_objs import *
-from dash.dependencies import Input, Output, State, Event
+from dash.dependencies import ClientsideFunction, Input, Output, State
 
 app = dash.Dash(__name__)
 server = app.server
 app.title = 'NYC Wi-Fi Hotspots'
+# timings and payload sizes of the callbacks at /metrics
+metrics = callback_metrics.instrument(app)
+# brotli or gzip for the map, table and layout payloads
+compression.compress(app)
+# Bootstrap grid CSS, served locally once copied to static/grid.css
+static_assets.install(app)
 
 # API keys and datasets
 mapbox_access_token = 'USE YOUR MAPBOX KEY HERE'
-map_data = pd.read_csv("nyc-wi-fi-hotspot-locations.csv")
 
-# Selecting only required columns
-map_data = map_data[["Borough", "Type", "Provider", "Name", "Location", "Latitude", "Longitude"]].drop_duplicates()
+# The CSV is parsed once into a typed columnar cache (see hotspots.py), later
+# startups memory-map the cached columns and skip the text parse
+store = hotspots.load_hotspots("nyc-wi-fi-hotspot-locations.csv")
 
-# Boostrap CSS.
-app.css.append_css({'external_url': 'https://codepen.io/amyoshino/pen/jzXypZ.css'})
+# Row ids for every Borough x Type combination, built once so the filters
+# never scan or copy the whole frame
+filter_index = hotspots.FilterIndex(store, ('Borough', 'Type'))
+
+# Row counts per (Borough, Type, Provider), maintained at load
+count_cube = hotspots.CountCube(store, ('Borough', 'Type', 'Provider'))
+
+# Per-point map columns (coordinates, hovertext) aligned to row ids
+trace = hotspots.TraceColumns(store)
+
+# Quadtree over the coordinates, used to cluster points at low zoom
+spatial = hotspots.SpatialIndex(store)
+
+# The table is paged, sorted and filtered on the server, the browser only
+# holds the current page
+PAGE_SIZE = 20
+
+# Map figures for recently used filter states, users tend to switch between
+# the same few combinations
+map_cache = FigureCache(max_bytes=64 * 1024 * 1024)
+# its hits, misses, evictions and size are listed at /metrics
+metrics.expose('figure_cache', lambda: map_cache.stats(), (('cache', 'map'),),
+               counters=('hits', 'misses', 'evictions'))
+
+# Marker style deltas applied in the browser (assets/map_delta.js) to the
+# selected rows and to the rest of the points while a selection is active
+SELECTED_MARKER = {'size': 8, 'opacity': 1}
+UNSELECTED_MARKER = {'opacity': 0}
+
+# Zoom-aware decimation: below POINT_ZOOM, or when more than MAX_POINTS fall
+# in the viewport, points are grouped into about CLUSTER_CELLS clusters across
+# the visible width. Until the browser reports the visible bounds nothing is
+# clipped, and the clusters are sized on the width of the whole dataset.
+POINT_ZOOM = 13
+MAX_POINTS = 3000
+CLUSTER_CELLS = 40
 
 #  Layouts
 layout_table = dict(
@@ -61,6 +108,8 @@ layout_map = dict(
     paper_bgcolor='#fffcfc',
     legend=dict(font=dict(size=10), orientation='h'),
     title='WiFi Hotspots in NYC',
+    # keeps the user's pan/zoom when the figure is rebuilt for a new viewport
+    uirevision='hotspots',
     mapbox=dict(
         accesstoken=mapbox_access_token,
         style="light",
@@ -73,20 +122,19 @@ layout_map = dict(
 )
 
 # functions
-def gen_map(map_data):
-    # groupby returns a dictionary mapping the values of the first field
-    # 'classification' onto a list of record dictionaries with that
-    # classification value.
+def gen_map(ids):
+    # ids are row ids of the points to draw, every per-point column is
+    # gathered from the precomputed trace columns
     return {
         "data": [{
                 "type": "scattermapbox",
-                "lat": list(map_data['Latitude']),
-                "lon": list(map_data['Longitude']),
+                "lat": trace.lat[ids],
+                "lon": trace.lon[ids],
                 "hoverinfo": "text",
-                "hovertext": [["Name: {} <br>Type: {} <br>Provider: {}".format(i,j,k)]
-                                for i,j,k in zip(map_data['Name'], map_data['Type'],map_data['Provider'])],
+                "hovertext": trace.hovertext(ids),
                 "mode": "markers",
-                "name": list(map_data['Name']),
+                "name": trace.name(ids),
+                "customdata": ids,
                 "marker": {
                     "size": 6,
                     "opacity": 0.7
@@ -95,6 +143,51 @@ def gen_map(map_data):
         "layout": layout_map
     }
 
+def gen_clusters(keys, lat, lon, counts):
+    # one marker per quadtree cell, sized by the number of hotspots it holds
+    return {
+        "data": [{
+                "type": "scattermapbox",
+                "lat": np.round(lat, hotspots.COORD_DECIMALS),
+                "lon": np.round(lon, hotspots.COORD_DECIMALS),
+                "hoverinfo": "text",
+                "hovertext": np.char.add(counts.astype(str), ' hotspots'),
+                "mode": "markers",
+                "customdata": keys,
+                "marker": {
+                    "size": 6 + 4 * np.round(np.log2(counts), 1),
+                    "opacity": 0.7
+                }
+        }],
+        "layout": layout_map
+    }
+
+def viewport(relayout_data):
+    # visible (west, south, east, north) bounds of the map, None until the
+    # graph's relayoutData reports them, and its zoom
+    relayout_data = relayout_data or {}
+    zoom = relayout_data.get('mapbox.zoom', layout_map['mapbox']['zoom'])
+    derived = relayout_data.get('mapbox._derived')
+    if derived:
+        lons, lats = zip(*derived['coordinates'])
+        return (min(lons), min(lats), max(lons), max(lats)), zoom
+    return None, zoom
+
+def map_view(type, borough, relayout_data):
+    # row ids inside the viewport (in quadtree order) and the quadtree level
+    # to cluster them at, or None when the points are shown individually.
+    # The quadtree finds the points in view, then only those are checked
+    # against the Borough and Type filters
+    bounds, zoom = viewport(relayout_data)
+    ids = filter_index.select(spatial.query(bounds), borough, type)
+    if zoom >= POINT_ZOOM and len(ids) <= MAX_POINTS:
+        return ids, bounds, None
+    width = bounds[2] - bounds[0] if bounds else spatial.width
+    return ids, bounds, spatial.level_for(width / CLUSTER_CELLS)
+
+# Hotspot types for the Type dropdown, its options and initial selection
+hotspot_types = [str(item) for item in store.labels['Type']]
+
 app.layout = html.Div(
     html.Div([
         html.Div(
@@ -102,7 +195,7 @@ app.layout = html.Div(
                 html.H1(children='Maps and Tables',
                         className='nine columns'),
                 html.Img(
-                    src="https://www.fulcrumanalytics.com/wp-content/uploads/2017/12/cropped-site-logo-1.png",
+                    src=static_assets.url('site-logo.png'),
                     className='three columns',
                     style={
                         'height': '16%',
@@ -136,7 +229,7 @@ app.layout = html.Div(
                                     {'label': 'Brooklyn', 'value': 'BK'},
                                     {'label': 'Staten Island', 'value': 'SI'}
                                 ],
-                                values=['MN', 'BX', "QU",  'BK', 'SI'],
+                                value=['MN', 'BX', "QU",  'BK', 'SI'],
                                 labelStyle={'display': 'inline-block'}
                         ),
                     ],
@@ -148,11 +241,11 @@ app.layout = html.Div(
                         html.P('Type:'),
                         dcc.Dropdown(
                             id='type',
-                            options= [{'label': str(item),
-                                                  'value': str(item)}
-                                                 for item in set(map_data['Type'])],
+                            options= [{'label': item,
+                                                  'value': item}
+                                                 for item in hotspot_types],
                             multi=True,
-                            value=list(set(map_data['Type']))
+                            value=hotspot_types
                         )
                     ],
                     className='six columns',
@@ -167,6 +260,8 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
+                        dcc.Store(id='map-base'),
+                        dcc.Store(id='map-delta'),
                         dcc.Graph(id='map-graph',
                                   animate=True,
                                   style={'margin-top': '20'})
@@ -175,12 +270,17 @@ app.layout = html.Div(
                 html.Div(
                     [
                         dt.DataTable(
-                            rows=map_data.to_dict('records'),
-                            columns=map_data.columns,
-                            row_selectable=True,
-                            filterable=True,
-                            sortable=True,
-                            selected_row_indices=[],
+                            columns=[{'name': c, 'id': c} for c in hotspots.COLUMNS],
+                            row_selectable='multi',
+                            page_action='custom',
+                            page_current=0,
+                            page_size=PAGE_SIZE,
+                            sort_action='custom',
+                            sort_mode='multi',
+                            sort_by=[],
+                            filter_action='custom',
+                            filter_query='',
+                            selected_row_ids=[],
                             id='datatable'),
                     ],
                     style = layout_table,
@@ -203,38 +303,88 @@ app.layout = html.Div(
         )
     ], className='ten columns offset-by-one'))
 
+# Callbacks receive the filters and the selected row ids (the table's row
+# keys) instead of the table rows, and rebuild what they need on the server
+# The map is sent in two parts: the full figure only when the filters or the
+# viewport change, and a selection delta (the keys of the selected points plus
+# marker styles) that the browser applies to the figure it already has.
+# Points are keyed by row id, clusters by their quadtree cell.
+@app.callback(
+    Output('map-base', 'data'),
+    [Input('type', 'value'),
+     Input('boroughs', 'value'),
+     Input('map-graph', 'relayoutData')])
+def map_figure(type, borough, relayout_data):
+    ids, bounds, level = map_view(type, borough, relayout_data)
+
+    def build():
+        if level is None:
+            return gen_map(ids)
+        return gen_clusters(*spatial.clusters(ids, level))
+
+    key = fingerprint('map', set(borough or []), set(type or []), level,
+                      [round(b, 3) for b in bounds] if bounds else None)
+    return map_cache.get(key, build)
+
 @app.callback(
+    Output('map-delta', 'data'),
+    [Input('datatable', 'selected_row_ids'),
+     Input('type', 'value'),
+     Input('boroughs', 'value'),
+     Input('map-graph', 'relayoutData')])
+def map_selection(selected_row_ids, type, borough, relayout_data):
+    keys = np.asarray(selected_row_ids or [], dtype=np.int64)
+    if len(keys):
+        _, _, level = map_view(type, borough, relayout_data)
+        if level is not None:
+            keys = np.unique(spatial.cell_keys(keys, level))
+    return {'keys': keys.tolist(),
+            'selected': SELECTED_MARKER,
+            'unselected': UNSELECTED_MARKER}
+
+app.clientside_callback(
+    ClientsideFunction(namespace='hotspots', function_name='apply_delta'),
     Output('map-graph', 'figure'),
-    [Input('datatable', 'rows'),
-     Input('datatable', 'selected_row_indices')])
-def map_selection(rows, selected_row_indices):
-    aux = pd.DataFrame(rows)
-    temp_df = aux.ix[selected_row_indices, :]
-    if len(selected_row_indices) == 0:
-        return gen_map(aux)
-    return gen_map(temp_df)
+    [Input('map-base', 'data'),
+     Input('map-delta', 'data')])
 
 @app.callback(
-    Output('datatable', 'rows'),
+    [Output('datatable', 'data'),
+     Output('datatable', 'page_count'),
+     Output('datatable', 'page_current')],
     [Input('type', 'value'),
-     Input('boroughs', 'values')])
-def update_selected_row_indices(type, borough):
-    map_aux = map_data.copy()
+     Input('boroughs', 'value'),
+     Input('datatable', 'page_current'),
+     Input('datatable', 'page_size'),
+     Input('datatable', 'sort_by'),
+     Input('datatable', 'filter_query')])
+def update_selected_row_indices(type, borough, page_current, page_size, sort_by, filter_query):
+    # Boroughs and Type filters, answered from the index
+    ids = filter_index.rows(borough, type)
+    # Table filter and sorting, then only the requested page is sent
+    ids = store.filter_rows(ids, filter_query)
+    ids = store.sort_rows(ids, sort_by)
 
-    # Type filter
-    map_aux = map_aux[map_aux['Type'].isin(type)]
-    # Boroughs filter
-    map_aux = map_aux[map_aux["Borough"].isin(borough)]
-
-    rows = map_aux.to_dict('records')
-    return rows
+    # A new filter starts again from the first page, any other change keeps
+    # the page but never past the last one
+    page_size = page_size or PAGE_SIZE
+    page_count = max(1, -(-len(ids) // page_size))
+    triggered = [t['prop_id'] for t in dash.callback_context.triggered]
+    if any(not prop.startswith('datatable.') or prop == 'datatable.filter_query' for prop in triggered):
+        page_current = 0
+    page_current = min(page_current or 0, page_count - 1)
+    start = page_current * page_size
+    rows = store.records(ids[start:start + page_size])
+    return rows, page_count, page_current
 
 @app.callback(
     Output('bar-graph', 'figure'),
-    [Input('datatable', 'rows'),
-     Input('datatable', 'selected_row_indices')])
-def update_figure(rows, selected_row_indices):
-    dff = pd.DataFrame(rows)
+    [Input('type', 'value'),
+     Input('boroughs', 'value')])
+def update_figure(type, borough):
+    # The bar chart is answered from the Borough x Type x Provider count cube
+    boroughs, counts = count_cube.counts_by('Borough', {'Borough': borough, 'Type': type})
+    shown = counts > 0
 
     layout = go.Layout(
         bargap=0.05,
@@ -252,18 +402,32 @@ def update_figure(rows, selected_row_indices):
             showgrid=False,
             fixedrange=False,
             rangemode='nonnegative',
-            zeroline='hidden'
+            zeroline=False
         )
     )
 
-    data = Data([
+    # plain lists: plotly 6+ would send NumPy arrays inside go objects as
+    # base64 typed arrays, which the plotly.js of dash 1.x cannot read
+    data = [
          go.Bar(
-             x=dff.groupby('Borough', as_index = False).count()['Borough'],
-             y=dff.groupby('Borough', as_index = False).count()['Type']
+             x=boroughs[shown].tolist(),
+             y=counts[shown].tolist()
          )
-     ])
+     ]
 
     return go.Figure(data=data, layout=layout)
 
+# /_dash-layout is encoded once and revalidated with an ETag, a new dataset
+# (new checksum) re-encodes it
+layout_cache.install(app, version=lambda: store.checksum)
+
+# The dataset and its indexes are read-only memory maps of the files in
+# .hotspot_cache, so every worker of a pre-fork server shares one copy of
+# them (e.g. gunicorn --preload -w 4 ex4:server). Freezing the objects
+# created at import keeps the garbage collector from writing to, and so
+# copying, their pages in each worker.
+if hasattr(gc, 'freeze'):
+    gc.freeze()
+
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""A small LRU cache for callback figures, bounded by serialized size.
+
+A figure is encoded to JSON once, when it is built: the encoding gives its
+size for the byte budget, and the figure is kept decoded from it (plain
+lists and dicts, no NumPy arrays), so a hit is returned as is and Dash's
+encoder only has plain JSON types to write. The Python objects take a few
+times the budgeted JSON size in memory.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import plotly
+
+
+def fingerprint(*parts):
+    """Canonical key for a callback state.
+
+    Sets are treated as unordered, so {'MN', 'BX'} and {'BX', 'MN'} produce
+    the same key; pass multi-select values (checklists, dropdowns) as sets.
+    Lists and tuples keep their order, ex.: map bounds [w, s, e, n].
+    """
+    canonical = []
+    for part in parts:
+        if isinstance(part, (set, frozenset)):
+            part = sorted(part, key=repr)
+        elif isinstance(part, tuple):
+            part = list(part)
+        canonical.append(part)
+    encoded = json.dumps(canonical, sort_keys=True, default=repr)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+class FigureCache(object):
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key --> (figure, size of its JSON encoding)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Figure for ``key``, calling ``build()`` on a miss.
+
+        The returned figure is shared by every caller, it must not be
+        modified.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        payload = json.dumps(build(), cls=plotly.utils.PlotlyJSONEncoder)
+        figure = json.loads(payload)
+        size = len(payload)
+        if size > self.max_bytes:
+            return figure
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (figure, size)
+                self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+        return figure
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.bytes,
+                    'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
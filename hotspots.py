@@ -0,0 +1,568 @@
+# -*- coding: utf-8 -*-
+"""Loading and caching of the NYC Wi-Fi hotspot dataset used by ex4.py.
+
+The first load parses the CSV, keeps the columns the app needs and writes a
+typed columnar cache next to it: every text column is dictionary encoded
+(integer codes + sorted labels) and Latitude/Longitude are stored as float32.
+The labels of the near-unique text columns (Name, Location) are kept as one
+UTF-8 buffer plus offsets (``TextArray``) rather than fixed-width strings.
+Each array is a plain ``.npy`` file, so later startups memory-map the arrays
+instead of parsing text. The cache lives in a directory named after the CSV
+checksum and the cache format, and is rebuilt only when either changes.
+
+Indexes derived from the columns are cached the same way, so every process
+serving the app maps the same read-only file pages instead of holding its
+own copy (see ``HotspotStore.derived``).
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["Borough", "Type", "Provider", "Name", "Location", "Latitude", "Longitude"]
+CATEGORICAL = ["Borough", "Type", "Provider", "Name", "Location"]
+# near-unique text, its labels are stored as a TextArray
+TEXT = ["Name", "Location"]
+COORDINATES = ["Latitude", "Longitude"]
+# float32 keeps ~7 significant digits, i.e. 5 decimals for NYC coordinates
+COORD_DECIMALS = 5
+
+CACHE_DIR = '.hotspot_cache'
+# bump when the layout of the cached columns changes
+CACHE_FORMAT = 2
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+_FILTER_OPERATORS = {
+    'eq': lambda values, v: values == v,
+    'ne': lambda values, v: values != v,
+    'lt': lambda values, v: values < v,
+    'le': lambda values, v: values <= v,
+    'gt': lambda values, v: values > v,
+    'ge': lambda values, v: values >= v,
+    'contains': lambda values, v: np.char.find(values.astype(str), str(v)) >= 0,
+    'datestartswith': lambda values, v: np.char.startswith(values.astype(str), str(v)),
+}
+_OPERATOR_ALIASES = [('ge', '>='), ('le', '<='), ('lt', '<'), ('gt', '>'), ('ne', '!='),
+                     ('eq', '='), ('contains',), ('datestartswith',)]
+
+
+def _split_filter_part(part):
+    # parses one "{column} operator value" term of a DataTable filter_query,
+    # the value is returned as typed (unquoted), filter_rows converts it
+    for aliases in _OPERATOR_ALIASES:
+        for alias in aliases:
+            for prefix in ('', 's', 'i'):
+                token = ' {}{} '.format(prefix, alias)
+                if token in part:
+                    name, value = part.split(token, 1)
+                    name = name[name.find('{') + 1:name.rfind('}')]
+                    value = value.strip()
+                    if value[:1] in ('"', "'", '`') and value[-1:] == value[0]:
+                        value = value[1:-1]
+                    return name, aliases[0], value
+    return None, None, None
+
+
+class TextArray(object):
+    """Strings stored as one UTF-8 buffer and the offsets of each string.
+
+    ``data[offsets[i]:offsets[i + 1]]`` holds the bytes of string i. Unlike a
+    fixed-width ``<U`` array the size is the text itself, not the number of
+    strings times the longest one in UTF-32. Indexing with an integer returns
+    a str, with an array or slice a ``<U`` array of just those strings.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [str(string).encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            index = np.arange(len(self))[index]
+        index = np.asarray(index)
+        buffer = memoryview(self.data)
+        if index.ndim == 0:
+            return str(buffer[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+        starts, stops = self.offsets[index], self.offsets[index + 1]
+        return np.array([str(buffer[start:stop], 'utf-8') for start, stop in zip(starts.tolist(), stops.tolist())],
+                        dtype=str).reshape(index.shape)
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def _save_arrays(path, arrays, meta=None):
+    # write to a temporary directory first and rename it into place, so
+    # concurrent workers never see a half written cache
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=parent)
+    try:
+        for name, values in arrays.items():
+            if isinstance(values, TextArray):
+                np.save(os.path.join(tmp, name + '.utf8.npy'), values.data)
+                np.save(os.path.join(tmp, name + '.offsets.npy'), values.offsets)
+                continue
+            np.save(os.path.join(tmp, name + '.npy'), values)
+        if meta is not None:
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+        os.rename(tmp, path)
+    except OSError:
+        # another process won the race, its cache is identical
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+
+def _load_arrays(path):
+    # read-only memory maps: pages are shared by every process mapping them
+    arrays = dict((name[:-len('.npy')], np.load(os.path.join(path, name), mmap_mode='r'))
+                  for name in os.listdir(path) if name.endswith('.npy'))
+    for name in [name for name in arrays if name.endswith('.utf8')]:
+        base = name[:-len('.utf8')]
+        arrays[base] = TextArray(arrays.pop(name), arrays.pop(base + '.offsets'))
+    return arrays
+
+
+def _code_dtype(n_labels):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_labels < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class HotspotStore(object):
+    """Column arrays for the hotspot dataset.
+
+    ``codes[col]`` holds the integer codes of a categorical column and
+    ``labels[col]`` its sorted labels (a TextArray for the TEXT columns), so
+    code order is also lexical order.
+    ``coords[col]`` holds the float32 coordinates. Row ids are positions.
+    """
+
+    def __init__(self, codes, labels, coords, checksum=None, path=None):
+        self.codes = codes
+        self.labels = labels
+        self.coords = coords
+        self.checksum = checksum
+        self.path = path
+
+    def __len__(self):
+        return len(self.coords['Latitude'])
+
+    @classmethod
+    def from_frame(cls, df, checksum=None):
+        df = df[COLUMNS].drop_duplicates().reset_index(drop=True)
+        codes, labels = {}, {}
+        for col in CATEGORICAL:
+            cat = pd.Categorical(df[col].fillna('').astype(str))
+            if col in TEXT:
+                labels[col] = TextArray.from_strings(cat.categories)
+            else:
+                labels[col] = np.asarray(cat.categories, dtype=str)
+            codes[col] = cat.codes.astype(_code_dtype(len(labels[col])))
+        coords = dict((col, df[col].to_numpy(dtype=np.float32)) for col in COORDINATES)
+        return cls(codes, labels, coords, checksum)
+
+    def column(self, col, ids=None):
+        # decoded values of a column, optionally gathered for a set of row ids
+        if col in self.coords:
+            values = self.coords[col]
+            return values if ids is None else values[ids]
+        codes = self.codes[col] if ids is None else self.codes[col][ids]
+        return self.labels[col][codes]
+
+    def to_frame(self, ids=None):
+        data = {}
+        for col in COLUMNS:
+            if col in self.coords or col in TEXT:
+                data[col] = self.column(col, ids)
+            else:
+                codes = self.codes[col] if ids is None else self.codes[col][ids]
+                data[col] = pd.Categorical.from_codes(codes, self.labels[col])
+        return pd.DataFrame(data, columns=COLUMNS)
+
+    def records(self, ids):
+        # rows for the DataTable, keyed by row id so selections survive paging
+        columns = [(col, self.column(col, ids).tolist()) for col in CATEGORICAL]
+        columns += [(col, np.round(self.coords[col][ids].astype(np.float64), COORD_DECIMALS).tolist())
+                    for col in COORDINATES]
+        return [dict([('id', int(i))] + [(col, values[n]) for col, values in columns])
+                for n, i in enumerate(ids)]
+
+    def filter_rows(self, ids, filter_query):
+        """Apply a DataTable ``filter_query`` to the row ids ``ids``."""
+        for part in (filter_query or '').split(' && '):
+            col, op, value = _split_filter_part(part)
+            if col not in COLUMNS:
+                continue
+            if col in self.coords:
+                if op in ('contains', 'datestartswith'):
+                    values = self.column(col, ids).astype(str)
+                else:
+                    try:
+                        value = round(float(value), COORD_DECIMALS)
+                    except ValueError:
+                        continue
+                    # compare the values the table shows, rounded like records()
+                    values = np.round(self.coords[col][ids].astype(np.float64), COORD_DECIMALS)
+            elif col in TEXT:
+                # near-unique, decode only the rows being filtered
+                values = self.column(col, ids)
+            else:
+                # evaluate the predicate once per label, then look codes up
+                values = self.labels[col]
+            mask = _FILTER_OPERATORS[op](values, value)
+            if col not in self.coords and col not in TEXT:
+                mask = mask[self.codes[col][ids]]
+            ids = ids[mask]
+        return ids
+
+    def sort_rows(self, ids, sort_by):
+        """Order the row ids ``ids`` by a DataTable ``sort_by`` list."""
+        keys = []
+        for spec in reversed(sort_by or []):
+            col = spec.get('column_id')
+            if col not in COLUMNS:
+                continue
+            key = self.coords[col][ids] if col in self.coords else self.codes[col][ids].astype(np.int64)
+            keys.append(-key if spec.get('direction') == 'desc' else key)
+        if not keys:
+            return ids
+        return ids[np.lexsort(keys)]
+
+    def derived(self, name, build, params=()):
+        """Arrays computed from the store, cached next to its columns.
+
+        ``build()`` returns a dict of arrays. For a store loaded from the
+        cache they are written once under ``derived/<name>-<hash>`` and
+        returned as read-only memory maps, so pre-forked workers (and
+        separate server processes) share one copy through the page cache.
+        ``params`` lists what the arrays depend on besides the columns (a
+        format version, constants of the build), its hash is part of the
+        path so a changed build never reads arrays of the previous one.
+        """
+        if self.path is None:
+            return build()
+        digest = hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:12]
+        parent = os.path.join(self.path, 'derived')
+        path = os.path.join(parent, '{}-{}'.format(name, digest))
+        if not os.path.isdir(path):
+            if not os.path.isdir(parent):
+                os.makedirs(parent, exist_ok=True)
+            _save_arrays(path, build())
+            # drop the arrays of previous builds
+            for stale in os.listdir(parent):
+                if name in (stale, stale.rsplit('-', 1)[0]) and stale != os.path.basename(path):
+                    shutil.rmtree(os.path.join(parent, stale), ignore_errors=True)
+        return _load_arrays(path)
+
+    def save(self, path):
+        arrays = {}
+        for col in CATEGORICAL:
+            arrays[col + '.codes'] = self.codes[col]
+            arrays[col + '.labels'] = self.labels[col]
+        for col in COORDINATES:
+            arrays[col] = self.coords[col]
+        _save_arrays(path, arrays, {'checksum': self.checksum, 'rows': len(self)})
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = _load_arrays(path)
+        codes = dict((col, arrays[col + '.codes']) for col in CATEGORICAL)
+        labels = dict((col, arrays[col + '.labels']) for col in CATEGORICAL)
+        coords = dict((col, arrays[col]) for col in COORDINATES)
+        return cls(codes, labels, coords, meta['checksum'], path)
+
+
+class FilterIndex(object):
+    """Row ids grouped by every combination of a few categorical columns.
+
+    Rows are ordered by their combined key (stable, so ids stay sorted within
+    a group) and ``offsets`` marks where each group starts, i.e. every
+    Borough x Type intersection is precomputed as one contiguous slice.
+    Answering a filter only touches the slices of the selected groups.
+    """
+
+    # bump when build() changes, cached arrays of other versions are ignored
+    VERSION = 1
+
+    def __init__(self, store, columns=('Borough', 'Type')):
+        self.columns = tuple(columns)
+        self.positions = []
+        self.shape = []
+        for col in self.columns:
+            labels = store.labels[col]
+            self.positions.append(dict((label, i) for i, label in enumerate(labels)))
+            self.shape.append(len(labels))
+
+        def build():
+            key = np.zeros(len(store), dtype=np.int64)
+            for col, size in zip(self.columns, self.shape):
+                key = key * size + store.codes[col]
+            order = np.argsort(key, kind='stable')
+            return {'order': order,
+                    'offsets': np.searchsorted(key[order], np.arange(np.prod(self.shape) + 1))}
+
+        arrays = store.derived('filter-' + '-'.join(self.columns), build, (self.VERSION,))
+        self.order, self.offsets = arrays['order'], arrays['offsets']
+        self.codes = [store.codes[col] for col in self.columns]
+
+    def rows(self, *selections):
+        """Sorted row ids matching one list of accepted labels per column."""
+        codes = []
+        for positions, selected in zip(self.positions, selections):
+            codes.append([positions[label] for label in selected or [] if label in positions])
+        groups = np.ravel_multi_index(np.ix_(*codes), self.shape).ravel() if all(codes) else []
+        slices = [self.order[self.offsets[g]:self.offsets[g + 1]] for g in groups]
+        if not slices:
+            return np.empty(0, dtype=self.order.dtype)
+        return np.sort(np.concatenate(slices))
+
+    def select(self, ids, *selections):
+        """The row ids among ``ids``, in their order, matching one list of
+        accepted labels per column. Costs O(len(ids)), not O(matching rows)."""
+        keep = np.ones(len(ids), dtype=bool)
+        for codes, positions, size, selected in zip(self.codes, self.positions, self.shape, selections):
+            accepted = np.zeros(size, dtype=bool)
+            accepted[[positions[label] for label in selected or [] if label in positions]] = True
+            keep &= accepted[codes[ids]]
+        return ids[keep]
+
+
+class CountCube(object):
+    """Row counts for every combination of a few categorical columns."""
+
+    def __init__(self, store, columns=('Borough', 'Type', 'Provider')):
+        self.columns = tuple(columns)
+        self.labels = [store.labels[col] for col in self.columns]
+        self.positions = [dict((label, i) for i, label in enumerate(labels))
+                          for labels in self.labels]
+        shape = [len(labels) for labels in self.labels]
+        key = np.ravel_multi_index([store.codes[col].astype(np.int64) for col in self.columns], shape)
+        self.counts = np.bincount(key, minlength=int(np.prod(shape))).reshape(shape)
+
+    def counts_by(self, column, selections):
+        """Labels of ``column`` and their row counts under ``selections``.
+
+        ``selections`` maps column names to the accepted labels, columns
+        missing from it are not filtered.
+        """
+        index = []
+        for col, positions in zip(self.columns, self.positions):
+            selected = selections.get(col)
+            if selected is None:
+                index.append(np.arange(len(positions)))
+            else:
+                index.append(sorted(positions[label] for label in selected if label in positions))
+        axis = self.columns.index(column)
+        cells = self.counts[np.ix_(*index)]
+        totals = cells.sum(axis=tuple(i for i in range(cells.ndim) if i != axis))
+        return self.labels[axis][index[axis]], totals
+
+
+def _spread_bits(v):
+    # inserts a zero bit between each of the 16 low bits of v
+    v = v.astype(np.uint32) & 0x0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+class SpatialIndex(object):
+    """Linear quadtree over the hotspot coordinates.
+
+    Every point gets the Morton code of its cell at the deepest level
+    (16 bits per axis over the dataset bounding box); the cell at any
+    coarser level is a right shift of that code, and the points of a cell
+    are a contiguous range of the codes in sorted order. ``order`` holds the
+    row ids sorted by code and ``sorted`` their codes, so a viewport is a
+    few binary searches over the cells covering it, and clustering ids in
+    that order at a level is a run-length count, with no sort.
+    """
+
+    DEPTH = 16
+    # bump when build() changes, cached arrays of other versions are ignored
+    VERSION = 2
+    # cells per axis covering a viewport, more cells fit it more tightly
+    COVER_CELLS = 4
+
+    def __init__(self, store):
+        self.lat = store.coords['Latitude']
+        self.lon = store.coords['Longitude']
+
+        def build():
+            if not len(store):
+                empty = np.zeros(0, dtype=np.uint32)
+                return {'bounds': np.zeros(4), 'cells': empty, 'order': np.zeros(0, dtype=np.int64),
+                        'sorted': empty}
+            west, south, east, north = bounds = np.array(
+                [self.lon.min(), self.lat.min(), self.lon.max(), self.lat.max()], dtype=np.float64)
+            scale = (1 << self.DEPTH) - 1
+            x = np.floor((self.lon - west) / max(east - west, 1e-9) * scale)
+            y = np.floor((self.lat - south) / max(north - south, 1e-9) * scale)
+            cells = _spread_bits(x) | (_spread_bits(y) << 1)
+            order = np.argsort(cells, kind='stable')
+            return {'bounds': bounds, 'cells': cells, 'order': order, 'sorted': cells[order]}
+
+        arrays = store.derived('spatial', build, (self.VERSION, self.DEPTH))
+        self.cells = arrays['cells']
+        self.order, self.sorted = arrays['order'], arrays['sorted']
+        self.bounds = tuple(float(b) for b in arrays['bounds'])
+        west, south, east, north = self.bounds
+        self.width = max(east - west, 1e-9)
+        self.height = max(north - south, 1e-9)
+
+    def level_for(self, cell_size):
+        """Deepest level whose cells are at least ``cell_size`` degrees wide."""
+        if cell_size <= 0:
+            return self.DEPTH
+        level = int(np.floor(np.log2(max(self.width, self.height) / cell_size)))
+        return min(max(level, 0), self.DEPTH)
+
+    def _grid(self, value, low, size, margin):
+        # deepest level cell coordinate of a longitude or latitude, moved by
+        # one cell outwards against rounding at cell edges, and clamped
+        scale = (1 << self.DEPTH) - 1
+        return int(min(max(np.floor((value - low) / size * scale) + margin, 0), scale))
+
+    def query(self, bounds=None):
+        """Row ids inside (west, south, east, north) ``bounds``, in code order.
+
+        The viewport is covered by at most COVER_CELLS + 1 cells per axis, the
+        points of each are found by binary search in ``sorted``, and only
+        those candidates are checked against the bounds. Without bounds every
+        row id is returned.
+        """
+        if bounds is None:
+            return self.order
+        west, south, east, north = bounds
+        if not len(self.order) or west > self.bounds[2] or east < self.bounds[0] \
+                or south > self.bounds[3] or north < self.bounds[1]:
+            return self.order[:0]
+        x0, x1 = self._grid(west, self.bounds[0], self.width, -1), self._grid(east, self.bounds[0], self.width, 1)
+        y0, y1 = self._grid(south, self.bounds[1], self.height, -1), self._grid(north, self.bounds[1], self.height, 1)
+        # coarsest shift at which the viewport spans at most COVER_CELLS cells
+        shift = 0
+        while max(x1 - x0, y1 - y0) >> shift >= self.COVER_CELLS:
+            shift += 1
+        xs = np.arange(x0 >> shift, (x1 >> shift) + 1)
+        ys = np.arange(y0 >> shift, (y1 >> shift) + 1)
+        keys = np.sort((_spread_bits(xs[None, :]) | (_spread_bits(ys[:, None]) << 1)).ravel()).astype(np.int64)
+        # first and last code of each cell, as uint32 so the search does not
+        # convert ``sorted``
+        first = (keys << (2 * shift)).astype(np.uint32)
+        last = (((keys + 1) << (2 * shift)) - 1).astype(np.uint32)
+        starts = np.searchsorted(self.sorted, first, 'left')
+        stops = np.searchsorted(self.sorted, last, 'right')
+        ids = np.concatenate([self.order[start:stop] for start, stop in zip(starts, stops)])
+        lon, lat = self.lon[ids], self.lat[ids]
+        return ids[(lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)]
+
+    def cell_keys(self, ids, level):
+        return self.cells[ids] >> np.uint32(2 * (self.DEPTH - level))
+
+    def clusters(self, ids, level):
+        """Cell keys, centroids and point counts of ``ids`` at ``level``.
+
+        ``ids`` must be in code order, as returned by query(), so the points
+        of a cell are consecutive.
+        """
+        keys = self.cell_keys(ids, level)
+        if not len(keys):
+            return keys, np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+        lat = np.add.reduceat(self.lat[ids].astype(np.float64), starts) / counts
+        lon = np.add.reduceat(self.lon[ids].astype(np.float64), starts) / counts
+        return keys[starts], lat, lon, counts
+
+
+class TraceColumns(object):
+    """Per-point scattermapbox columns, computed once and aligned to row ids.
+
+    Hovertext depends only on (Name, Type, Provider), so the strings are
+    built once per distinct combination and rows keep an integer code into
+    them. Building a trace is then a gather by row ids.
+    """
+
+    # bump when _build() changes, cached arrays of other versions are ignored
+    VERSION = 1
+    HOVER_COLUMNS = ('Name', 'Type', 'Provider')
+    HOVER_TEMPLATE = ('Name: ', ' <br>Type: ', ' <br>Provider: ')
+
+    def __init__(self, store):
+        self.store = store
+        arrays = store.derived('trace', lambda: self._build(store),
+                               (self.VERSION, self.HOVER_COLUMNS, self.HOVER_TEMPLATE, COORD_DECIMALS))
+        self.lat, self.lon = arrays['lat'], arrays['lon']
+        self.hover_codes, self.hover_labels = arrays['hover_codes'], arrays['hover_labels']
+
+    def _build(self, store):
+        arrays = {
+            'lat': np.round(store.coords['Latitude'].astype(np.float64), COORD_DECIMALS),
+            'lon': np.round(store.coords['Longitude'].astype(np.float64), COORD_DECIMALS),
+        }
+        shape = [len(store.labels[col]) for col in self.HOVER_COLUMNS]
+        key = np.ravel_multi_index([store.codes[col].astype(np.int64) for col in self.HOVER_COLUMNS], shape)
+        combos, hover_codes = np.unique(key, return_inverse=True)
+        arrays['hover_codes'] = hover_codes.astype(_code_dtype(len(combos)))
+
+        text = np.array([''], dtype=str)
+        for col, prefix, codes in zip(self.HOVER_COLUMNS, self.HOVER_TEMPLATE,
+                                      np.unravel_index(combos, shape)):
+            text = np.char.add(np.char.add(text, prefix), store.labels[col][codes])
+        arrays['hover_labels'] = TextArray.from_strings(text)
+        return arrays
+
+    def hovertext(self, ids):
+        return self.hover_labels[self.hover_codes[ids]]
+
+    def name(self, ids):
+        return self.store.column('Name', ids)
+
+
+def load_hotspots(csv_path, cache_dir=None):
+    """Return a HotspotStore for ``csv_path``, building its cache if needed."""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR)
+    checksum = file_checksum(csv_path)
+    path = os.path.join(cache_dir, '{}-v{}'.format(checksum, CACHE_FORMAT))
+
+    if not os.path.isdir(path):
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        store = HotspotStore.from_frame(pd.read_csv(csv_path, usecols=COLUMNS), checksum)
+        store.save(path)
+        # drop caches of older versions of the CSV or of the format
+        for name in os.listdir(cache_dir):
+            if name != os.path.basename(path) and not name.startswith('.tmp-'):
+                shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+    return HotspotStore.load(path)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Serves a Dash app's /_dash-layout from memoized JSON bytes with an ETag.
+
+    layout_cache.install(app, version=lambda: store.checksum)
+
+The layout is encoded once and kept as bytes until ``version()`` changes or
+a new layout is assigned to app.layout, so a page load no longer re-encodes
+it. The response carries an ETag of the bytes and Cache-Control: no-cache:
+browsers revalidate on every load and get a 304 while the layout is
+unchanged. Layouts given as a function (built per page load) are served by
+Dash as usual.
+"""
+import hashlib
+import json
+import threading
+
+import flask
+import plotly
+
+
+class LayoutCache(object):
+
+    def __init__(self, app, version=None):
+        self.app = app
+        self.version = version or (lambda: None)
+        self.encodes = 0
+        self._cached = (None, None, None)
+        self._lock = threading.Lock()
+
+    def install(self):
+        for rule in self.app.server.url_map.iter_rules():
+            if rule.rule.endswith('_dash-layout'):
+                self._dash_view = self.app.server.view_functions[rule.endpoint]
+                self.app.server.view_functions[rule.endpoint] = self.serve
+        return self
+
+    def encoded(self):
+        """(JSON bytes, etag) of the current layout."""
+        layout = self.app.layout
+        key = (self.version(), id(layout))
+        cached = self._cached
+        if cached[0] != key:
+            with self._lock:
+                cached = self._cached
+                if cached[0] != key:
+                    body = json.dumps(layout, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8')
+                    cached = self._cached = (key, body, hashlib.sha1(body).hexdigest()[:20])
+                    self.encodes += 1
+        return cached[1], cached[2]
+
+    def serve(self):
+        if callable(self.app.layout):
+            return self._dash_view()
+        body, etag = self.encoded()
+        response = flask.Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(flask.request)
+
+
+def install(app, version=None):
+    """Memoizes the layout of ``app``, re-encoded when ``version()`` changes."""
+    return LayoutCache(app, version).install()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Local, content-hashed static files (grid CSS, logos) for the tutorial apps.
+
+    app = dash.Dash()
+    static_assets.install(app)                  # links static/grid.css
+    html.Img(src=static_assets.url('logo.png'))
+
+Files of the static/ folder are served at /static-assets/<name>.<hash><ext>,
+the hash being the start of the SHA-256 of their content, with a one-year
+immutable Cache-Control: a changed file gets a new URL, so browsers never
+need to revalidate. Once every file of ORIGINALS is copied into static/,
+nothing is fetched from other hosts and the apps work offline; until then
+the missing ones are linked at their original URL.
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+
+import flask
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+URL_PREFIX = '/static-assets/'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# where the apps loaded their assets from, used while static/ has no copy
+ORIGINALS = {
+    'grid.css': 'https://codepen.io/amyoshino/pen/jzXypZ.css',
+    'logo.png': 'http://test.fulcrumanalytics.com/wp-content/uploads/2015/10/Fulcrum-logo_840X144.png',
+    'site-logo.png': 'https://www.fulcrumanalytics.com/wp-content/uploads/2017/12/cropped-site-logo-1.png',
+}
+
+_files = None
+_lock = threading.Lock()
+
+
+def _load():
+    # {fingerprinted name: (data, mimetype, digest)} and {name: fingerprinted name}
+    global _files
+    with _lock:
+        if _files is None:
+            served, names = {}, {}
+            listed = os.listdir(STATIC_DIR) if os.path.isdir(STATIC_DIR) else []
+            for name in sorted(listed):
+                path = os.path.join(STATIC_DIR, name)
+                if not os.path.isfile(path):
+                    continue
+                with open(path, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                base, ext = os.path.splitext(name)
+                fingerprinted = '{}.{}{}'.format(base, digest, ext)
+                mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                served[fingerprinted] = (data, mimetype, digest)
+                names[name] = fingerprinted
+            _files = served, names
+    return _files
+
+
+def url(name):
+    """Fingerprinted URL of static/<name>, or its original URL while static/
+    holds no copy of it."""
+    names = _load()[1]
+    if name in names:
+        return URL_PREFIX + names[name]
+    return ORIGINALS[name]
+
+
+def serve(filename):
+    entry = _load()[0].get(filename)
+    if entry is None:
+        flask.abort(404)
+    data, mimetype, digest = entry
+    response = flask.Response(data, mimetype=mimetype)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.set_etag(digest)
+    return response.make_conditional(flask.request)
+
+
+def install(app, stylesheets=('grid.css',)):
+    """Serves static/ on the app's server and links ``stylesheets`` in its page."""
+    server = app.server
+    if 'static_assets' not in server.view_functions:
+        server.add_url_rule(URL_PREFIX + '<path:filename>', 'static_assets', serve)
+    links = ''.join('\n        <link rel="stylesheet" href="{}">'.format(url(name)) for name in stylesheets)
+    app.index_string = app.index_string.replace('{%css%}', '{%css%}' + links, 1)
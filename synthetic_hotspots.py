@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Synthetic NYC hotspot data at any size, for load testing ex4.py.
+
+Every synthetic row copies the categorical columns of a randomly drawn real
+row, so the joint Borough/Type/Provider distribution matches the bundled
+CSV, and jitters its coordinates by a few hundred metres.
+
+    python synthetic_hotspots.py 1000000 --out hotspots-1m.csv
+"""
+import argparse
+
+import numpy as np
+
+import hotspots
+
+
+def generate(source, rows, seed=0, jitter=0.002):
+    """A HotspotStore with ``rows`` rows drawn from the store ``source``."""
+    rng = np.random.RandomState(seed)
+    template = rng.randint(0, len(source), size=rows)
+    codes = dict((col, source.codes[col][template]) for col in hotspots.CATEGORICAL)
+    labels = dict((col, source.labels[col]) for col in hotspots.CATEGORICAL)
+    coords = {}
+    for col in hotspots.COORDINATES:
+        noise = rng.normal(0, jitter, size=rows)
+        coords[col] = (source.coords[col][template] + noise).astype(np.float32)
+    return hotspots.HotspotStore(codes, labels, coords, checksum='synthetic-{}-{}'.format(rows, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('rows', type=int)
+    parser.add_argument('--source', default='nyc-wi-fi-hotspot-locations.csv')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True, help='CSV file to write')
+    args = parser.parse_args()
+
+    store = generate(hotspots.load_hotspots(args.source), args.rows, args.seed)
+    store.to_frame().to_csv(args.out, index=False)
+
+
+if __name__ == '__main__':
+    main()